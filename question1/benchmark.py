@@ -0,0 +1,169 @@
+# Github: https://github.com/19rafsan97/HIT137_Assignment_3
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+from summarizer_app import Summarizer, add_backend_arguments, peak_rss_mb, percentile, summarizer_options
+
+# Fixed corpus so runs on different days and machines are comparable
+PARAGRAPHS = [
+    "The city council voted on Tuesday to approve a new public transport plan that will add three bus routes "
+    "and extend the light rail line to the northern suburbs by 2027. The plan, which has been under discussion "
+    "for more than two years, is expected to cost 480 million dollars, with most of the funding coming from "
+    "state grants and a modest increase in local property taxes.",
+    "Supporters argue that the expansion will reduce traffic congestion, cut emissions and give residents in "
+    "fast-growing neighbourhoods better access to jobs in the city centre. Opponents, including several small "
+    "business groups, say the tax increase comes at a difficult time and that the council has underestimated "
+    "construction costs.",
+    "Researchers at the university have developed a low-cost sensor that can detect early signs of crop disease "
+    "by measuring changes in the light reflected from leaves. Field trials on wheat and barley farms found that "
+    "the sensor identified infections up to ten days before they were visible to the naked eye, giving farmers "
+    "time to treat affected areas and reduce the amount of fungicide they use.",
+    "The national weather service issued a heat warning for much of the coast, with temperatures expected to "
+    "exceed 40 degrees for the third consecutive day. Hospitals reported a rise in heat-related admissions, and "
+    "authorities urged residents to check on elderly neighbours, stay indoors during the hottest part of the day "
+    "and drink plenty of water.",
+    "Quarterly results released on Friday showed the company's revenue rose eight percent compared with the "
+    "same period last year, driven by strong demand for its cloud services. Profit margins narrowed, however, "
+    "as the company increased spending on data centres and hired more engineers, and executives warned that "
+    "growth could slow in the second half of the year.",
+    "The museum's new exhibition brings together more than two hundred objects from collections across the "
+    "region, many of which have never been shown in public. Curators spent three years tracing the history of "
+    "each item, and the exhibition includes interactive displays that let visitors explore how the objects "
+    "were made, traded and used.",
+]
+
+CORPUS = {
+    "short": PARAGRAPHS[0],
+    "medium": " ".join(PARAGRAPHS[:4]),
+    # Long enough to go through the chunked map-reduce path
+    "long": " ".join(PARAGRAPHS * 8),
+}
+
+SETTINGS = {
+    "beam": {"max_length": 50, "min_length": 25},
+    "beam-long-output": {"max_length": 142, "min_length": 56},
+    "sampled": {"max_length": 50, "min_length": 25, "do_sample": True},
+    "stream-greedy": {"max_length": 50, "min_length": 25, "stream": True},
+}
+
+
+def run_once(summarizer, text, setting):
+    options = dict(setting)
+    started = time.perf_counter()
+    if options.pop("stream", False):
+        for _ in summarizer.summarize_stream(text, **options):
+            pass
+    else:
+        summarizer.summarize(text, **options)
+    latency = time.perf_counter() - started
+    output_tokens = summarizer.metrics.records[-1].get("output_tokens", 0)
+    return latency, output_tokens
+
+
+def run_benchmark(summarizer, settings, sizes, repeats):
+    import torch
+
+    results = []
+    for setting_name in settings:
+        for size in sizes:
+            text = CORPUS[size]
+            torch.manual_seed(0)
+            # Warm-up call, not counted
+            run_once(summarizer, text, SETTINGS[setting_name])
+            latencies, output_tokens = [], 0
+            for _ in range(repeats):
+                latency, tokens = run_once(summarizer, text, SETTINGS[setting_name])
+                latencies.append(latency)
+                output_tokens += tokens
+            total = sum(latencies)
+            results.append({
+                "setting": setting_name,
+                "size": size,
+                "repeats": repeats,
+                "p50_seconds": percentile(latencies, 50),
+                "p95_seconds": percentile(latencies, 95),
+                "docs_per_second": repeats / total,
+                "tokens_per_second": output_tokens / total,
+            })
+            print(f"{setting_name:<18} {size:<7} p50 {results[-1]['p50_seconds']:.3f} s  "
+                  f"p95 {results[-1]['p95_seconds']:.3f} s  {results[-1]['docs_per_second']:.2f} docs/s  "
+                  f"{results[-1]['tokens_per_second']:.1f} tok/s", file=sys.stderr)
+    return results
+
+
+# Compares p50 latencies with an earlier run and returns the rows that got slower than the tolerance
+def find_regressions(results, baseline, tolerance):
+    previous = {(row["setting"], row["size"]): row for row in baseline["results"]}
+    regressions = []
+    for row in results:
+        before = previous.get((row["setting"], row["size"]))
+        if before and row["p50_seconds"] > before["p50_seconds"] * (1 + tolerance):
+            regressions.append((row, before))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reproducible latency and throughput benchmark for the summarizer")
+    parser.add_argument("--settings", default=",".join(SETTINGS),
+                        help=f"comma-separated generation settings ({', '.join(SETTINGS)})")
+    parser.add_argument("--sizes", default=",".join(CORPUS), help="comma-separated corpus sizes")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--metrics-out", help="write the per-request metrics to this .json or .csv file")
+    parser.add_argument("--baseline", help="earlier --output file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="allowed p50 slowdown against the baseline (default 10%%)")
+    add_backend_arguments(parser)
+    args = parser.parse_args(argv)
+
+    settings = [name.strip() for name in args.settings.split(",")]
+    sizes = [name.strip() for name in args.sizes.split(",")]
+    for name in settings:
+        if name not in SETTINGS:
+            parser.error(f"unknown setting {name!r}")
+    for name in sizes:
+        if name not in CORPUS:
+            parser.error(f"unknown size {name!r}")
+
+    # The cache would turn every repeat after the first into a lookup
+    summarizer = Summarizer(use_cache=False, **summarizer_options(args))
+    summarizer.wait_until_ready()
+    import torch
+
+    results = run_benchmark(summarizer, settings, sizes, args.repeats)
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "threads": torch.get_num_threads(),
+            "machine": platform.machine(),
+            "backend": summarizer.backend,
+            "model": summarizer.model_name,
+            "peak_rss_mb": peak_rss_mb(),
+        },
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    if args.metrics_out:
+        summarizer.metrics.export(args.metrics_out)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = find_regressions(results, json.load(file), args.tolerance)
+        for row, before in regressions:
+            print(f"Regression: {row['setting']}/{row['size']} p50 {before['p50_seconds']:.3f} s -> "
+                  f"{row['p50_seconds']:.3f} s", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,37 +1,930 @@
 # Github: https://github.com/19rafsan97/HIT137_Assignment_3
 
+import time
+
+# Taken before anything heavy is imported, so startup timing covers the whole launch
+PROCESS_START = time.perf_counter()
+
+import argparse
+import csv
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import math
+import os
+import queue
+import re
+import sys
+import threading
 import tkinter as tk
-from tkinter import messagebox
-from transformers import pipeline
+import urllib.error
+import urllib.request
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; memory figures are reported as unknown there
+    resource = None
+from tkinter import filedialog, messagebox
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "facebook/bart-large-cnn"
+
+# CPU inference backends: full precision, dynamic int8 quantization of the Linear layers,
+# or a smaller distilled checkpoint (pass a local path with --model-path to run fully offline)
+BACKENDS = ("default", "int8", "distilled")
+DISTILLED_MODEL_NAME = "sshleifer/distilbart-cnn-12-6"
+
+# The window has to be on screen within this budget; checked by --startup-check
+STARTUP_BUDGET_SECONDS = 1.0
+
+# Long-document settings: BART reads at most 1024 tokens, so documents are split
+# into chunks that fit the window, with a few sentences of overlap between them
+CHUNK_TOKENS = 900
+CHUNK_OVERLAP_TOKENS = 64
+CHUNK_BATCH_SIZE = 4
+CHUNK_SUMMARY_MAX_LENGTH = 128
+CHUNK_SUMMARY_MIN_LENGTH = 32
+# How long documents are split: at content-chosen paragraph boundaries so edits reuse cached chunk
+# summaries, or into sentence chunks that overlap by CHUNK_OVERLAP_TOKENS
+CHUNKING_MODES = ("paragraph", "overlap")
+
+# Rephrase samples this many candidates in one generate call and hands them out one click at a time
+REPHRASE_CANDIDATES = 4
+
+# Summary cache settings: a bounded in-memory LRU in front of a size-capped directory that survives restarts
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "summarizer_app")
+CACHE_MEMORY_ENTRIES = 256
+CACHE_DISK_BYTES = 64 * 1024 * 1024
+
+# Bulk mode settings: documents are read a window at a time, sorted by length and packed into
+# batches whose padded size stays under a token budget
+BULK_WINDOW_DOCUMENTS = 256
+BULK_BATCH_TOKENS = 8192
+BULK_MAX_BATCH_SIZE = 16
+
+# Metrics: the phases each model call is split into, and how many records are kept in memory
+PHASES = ("condense", "tokenize", "encode", "generate", "decode")
+METRICS_MAX_RECORDS = 10000
+
+# Incremental mode: chunks are cut at content-defined paragraph boundaries (a paragraph whose hash is divisible
+# by the modulus, once the chunk has reached the minimum size), so an edit only disturbs the chunk it falls in
+INCREMENTAL_MIN_CHUNK_TOKENS = 300
+INCREMENTAL_BOUNDARY_MODULUS = 4
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+PARAGRAPH_BOUNDARY = re.compile(r'\n\s*\n')
+
+
+# Splitting text into sentences on terminal punctuation
+def split_sentences(text):
+    return [sentence for sentence in SENTENCE_BOUNDARY.split(" ".join(text.split())) if sentence]
+
+
+# Peak resident memory of this process in MB, or None where the platform does not report it
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+# Nearest-rank percentile of a list of numbers (q between 0 and 100)
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+# Held while transformers is imported; a second thread importing it mid-way gets a half-initialised module
+TRANSFORMERS_IMPORT_LOCK = threading.Lock()
+
+
+# Stopwatch that splits one model call into named phases
+class PhaseTimer:
+    def __init__(self):
+        self.started = self._last = time.perf_counter()
+        self.phases = {}
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self._last
+        self._last = now
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+# Per-request inference metrics: phase timings, token counts, throughput and peak memory.
+# Hooks registered with add_hook are called with every finished record.
+class InferenceMetrics:
+    FIELDS = ["timestamp", "kind", "cache", "batch_size", "model_calls", "chunks", "reused_chunks", "input_chars",
+              "input_tokens", "output_tokens"] + [f"{phase}_seconds" for phase in PHASES] + \
+             ["total_seconds", "tokens_per_second", "time_to_first_token", "peak_rss_mb"]
+
+    def __init__(self, max_records=METRICS_MAX_RECORDS):
+        self.records = deque(maxlen=max_records)
+        self._hooks = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def add_hook(self, hook):
+        self._hooks.append(hook)
+
+    @contextmanager
+    def request(self, kind, **fields):
+        # Model calls made inside the block are summed into a single record; nested requests fold
+        # into the outermost one, so a long document still counts as one request
+        if getattr(self._local, "request", None) is not None:
+            yield {}
+            return
+        record = {"kind": kind, "model_calls": 0, "input_tokens": 0, "output_tokens": 0}
+        record.update({f"{phase}_seconds": 0.0 for phase in PHASES})
+        record.update(fields)
+        self._local.request = record
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            self._local.request = None
+            record["total_seconds"] = time.perf_counter() - started
+            self._finish(record)
+
+    def add_model_call(self, timer, batch_size, input_tokens, output_tokens):
+        record = getattr(self._local, "request", None)
+        if record is None:
+            self.record("model_call", timer, batch_size=batch_size, input_tokens=input_tokens,
+                        output_tokens=output_tokens)
+            return
+        record["model_calls"] += 1
+        record["input_tokens"] += input_tokens
+        record["output_tokens"] += output_tokens
+        for phase, seconds in timer.phases.items():
+            record[f"{phase}_seconds"] = record.get(f"{phase}_seconds", 0.0) + seconds
+
+    def annotate(self, **counts):
+        # Adds counters to the request in progress on this thread, if there is one
+        record = getattr(self._local, "request", None)
+        if record is not None:
+            for name, value in counts.items():
+                record[name] = record.get(name, 0) + value
+
+    def record(self, kind, timer=None, **fields):
+        record = {"kind": kind}
+        if timer is not None:
+            record.update({f"{phase}_seconds": seconds for phase, seconds in timer.phases.items()})
+            record["total_seconds"] = timer.elapsed()
+        record.update(fields)
+        self._finish(record)
+
+    # Takes in records made elsewhere, such as by pool worker processes
+    def add_records(self, records):
+        with self._lock:
+            self.records.extend(records)
+        for record in records:
+            for hook in self._hooks:
+                hook(record)
+
+    def _finish(self, record):
+        record["timestamp"] = time.time()
+        total = record.get("total_seconds")
+        if record.get("output_tokens") and total:
+            record["tokens_per_second"] = record["output_tokens"] / total
+        record["peak_rss_mb"] = peak_rss_mb()
+        with self._lock:
+            self.records.append(record)
+        for hook in self._hooks:
+            hook(record)
+
+    def summary(self):
+        with self._lock:
+            records = list(self.records)
+        kinds = {}
+        for record in records:
+            if "total_seconds" in record:
+                kinds.setdefault(record["kind"], []).append(record)
+        summary = {}
+        for kind, kind_records in kinds.items():
+            latencies = [record["total_seconds"] for record in kind_records]
+            output_tokens = sum(record.get("output_tokens", 0) for record in kind_records)
+            summary[kind] = {
+                "count": len(kind_records),
+                "p50_seconds": percentile(latencies, 50),
+                "p95_seconds": percentile(latencies, 95),
+                "tokens_per_second": output_tokens / sum(latencies) if sum(latencies) else 0.0,
+            }
+        return summary
+
+    def export(self, path):
+        # CSV for spreadsheets, JSON (records plus per-kind summary) for everything else
+        with self._lock:
+            records = list(self.records)
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            if path.lower().endswith(".csv"):
+                writer = csv.DictWriter(file, fieldnames=self.FIELDS, extrasaction="ignore")
+                writer.writeheader()
+                writer.writerows(records)
+            else:
+                json.dump({"records": records, "summary": self.summary()}, file, indent=2)
+
+
+# Normalizing whitespace so cosmetic differences in the input still hit the cache
+def normalize_text(text):
+    return " ".join(text.split())
+
+
+# Content-addressed cache of finished summaries, keyed by the input, the model and the generation settings
+class SummaryCache:
+    def __init__(self, directory=CACHE_DIR, memory_entries=CACHE_MEMORY_ENTRIES, disk_bytes=CACHE_DISK_BYTES):
+        self.memory_entries = memory_entries
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_usage = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+        try:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        except OSError:
+            # Fall back to the memory tier when the cache directory is not writable
+            directory = None
+        self.directory = directory
+
+    @staticmethod
+    def make_key(text, model_name, **params):
+        payload = json.dumps({"text": normalize_text(text), "model": model_name, "params": params}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                self.seconds_saved += entry["seconds"]
+                return entry["summary"]
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self.seconds_saved += entry["seconds"]
+            self._remember(key, entry)
+        return entry["summary"]
+
+    def put(self, key, summary, seconds=0.0):
+        entry = {"summary": summary, "seconds": seconds}
+        with self._lock:
+            self._remember(key, entry)
+        self._write_disk(key, entry)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "seconds_saved": self.seconds_saved,
+                "memory_entries": len(self._memory),
+            }
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def _read_disk(self, key):
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as file:
+                entry = json.load(file)
+            # Touching the file keeps recently used entries at the back of the eviction order
+            os.utime(path)
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key, entry):
+        if not self.directory:
+            return
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(entry, file)
+            # An entry written over an existing one only adds the difference in size
+            try:
+                old_size = os.path.getsize(path)
+            except OSError:
+                old_size = 0
+            # Atomic rename, so a reader never sees a half-written entry
+            os.replace(temp_path, path)
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        with self._lock:
+            if self._disk_usage is None:
+                self._disk_usage = sum(size for _, size, _ in self._scan_disk())
+            else:
+                self._disk_usage += size - old_size
+            if self._disk_usage > self.disk_bytes:
+                self._evict_disk()
+
+    def _scan_disk(self):
+        entries = []
+        for item in os.scandir(self.directory):
+            if item.name.endswith(".json"):
+                try:
+                    stat = item.stat()
+                except OSError:
+                    continue
+                entries.append((item.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict_disk(self):
+        # Remove the least recently used files until the store is back under 90% of its budget
+        entries = sorted(self._scan_disk(), key=lambda entry: entry[2])
+        usage = sum(size for _, size, _ in entries)
+        target = self.disk_bytes * 0.9
+        for path, size, _ in entries:
+            if usage <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            usage -= size
+        self._disk_usage = usage
 
 
 # Creating a class for Text Summarization using the facebook/bart-large-cnn model
 class Summarizer:
-    def __init__(self):
-        # Encapsulation: Using a pre-trained summarization model
-        self._summarizer_model = pipeline("summarization", model="facebook/bart-large-cnn")
+    def __init__(self, preload=True, use_cache=True, cache_dir=CACHE_DIR, backend="default", model_path=None,
+                 intra_op_threads=None, inter_op_threads=None, inference_mode=True, offline=False, incremental=True):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+        self.backend = backend
+        self.model_name = model_path or (DISTILLED_MODEL_NAME if backend == "distilled" else MODEL_NAME)
+        # Quantized weights give slightly different outputs, so they get their own cache entries
+        self.model_id = f"{self.model_name}+int8" if backend == "int8" else self.model_name
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.inference_mode = inference_mode
+        self.offline = offline
+        # Long documents are chunked on stable paragraph boundaries so unchanged chunks reuse cached summaries
+        self.incremental = incremental
+        self.cache = SummaryCache(cache_dir) if use_cache else None
+        self.metrics = InferenceMetrics()
+        # Encapsulation: the pre-trained model is loaded on a warm-up thread and reached through _model_and_tokenizer
+        self._model = None
+        self._tokenizer = None
+        self._model_error = None
+        self._streamer_class = None
+        self._encoder_output_class = None
+        self._model_ready = threading.Event()
+        self._load_lock = threading.Lock()
+        self._load_started = False
+        self._rephrase_state = None
+        self._rephrase_lock = threading.Lock()
+        if preload:
+            self.start_loading()
+
+    def start_loading(self):
+        with self._load_lock:
+            failed = self._model_ready.is_set() and self._model_error is not None
+            if self._load_started and not failed:
+                return
+            # A load that failed is tried again, so one transient error does not last the whole session
+            self._load_started = True
+            self._model_error = None
+            self._model_ready.clear()
+        threading.Thread(target=self._load_model, daemon=True).start()
+
+    def _load_model(self):
+        load_error = None
+        try:
+            # transformers pulls in torch, so it is imported here instead of at module import. This is the only
+            # place it is imported, under a lock, because two threads importing it at once can both fail.
+            with TRANSFORMERS_IMPORT_LOCK:
+                import torch
+                from transformers import AutoModelForSeq2SeqLM, AutoTokenizer, TextIteratorStreamer
+                from transformers.modeling_outputs import BaseModelOutput
+            self._streamer_class = TextIteratorStreamer
+            self._encoder_output_class = BaseModelOutput
+
+            if self.intra_op_threads:
+                torch.set_num_threads(self.intra_op_threads)
+            if self.inter_op_threads:
+                try:
+                    torch.set_num_interop_threads(self.inter_op_threads)
+                except RuntimeError:
+                    # torch only accepts this once per process, before any parallel work has run
+                    pass
+
+            tokenizer = AutoTokenizer.from_pretrained(self.model_name, local_files_only=self.offline)
+            model = AutoModelForSeq2SeqLM.from_pretrained(self.model_name, local_files_only=self.offline)
+            model.eval()
+            if self.backend == "int8":
+                model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            self._model, self._tokenizer = model, tokenizer
+        except Exception as error:
+            load_error = error
+        finally:
+            with self._load_lock:
+                self._model_error = load_error
+                self._model_ready.set()
+
+    @property
+    def model_ready(self):
+        return self._model_ready.is_set() and self._model_error is None
+
+    @property
+    def model_error(self):
+        return self._model_error
+
+    def wait_until_ready(self):
+        # Calls made before the warm-up finishes wait for it instead of failing
+        self.start_loading()
+        self._model_ready.wait()
+        if self._model_error is not None:
+            raise RuntimeError(f"The summarization model failed to load: {self._model_error}")
+
+    def _model_and_tokenizer(self):
+        self.wait_until_ready()
+        return self._model, self._tokenizer
+
+    def _inference_context(self):
+        import torch
+        return torch.inference_mode() if self.inference_mode else torch.no_grad()
 
-    def summarize(self, text, max_length=50, min_length=25, do_sample=False):
+    def _run_model(self, texts, max_length, min_length, do_sample=False, batch_size=None):
+        # Tokenize, encode, generate and decode run as separate steps so each one is timed in the metrics
+        model, tokenizer = self._model_and_tokenizer()
+        batch_size = batch_size or len(texts)
+        summaries = []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            timer = PhaseTimer()
+            with self._inference_context():
+                inputs = tokenizer(batch, return_tensors="pt", padding=True, truncation=True).to(model.device)
+                timer.lap("tokenize")
+                encoder_states = model.get_encoder()(input_ids=inputs["input_ids"],
+                                                     attention_mask=inputs["attention_mask"]).last_hidden_state
+                timer.lap("encode")
+                encoder_outputs = self._encoder_output_class(last_hidden_state=encoder_states)
+                output_ids = model.generate(encoder_outputs=encoder_outputs,
+                                            attention_mask=inputs["attention_mask"], max_length=max_length,
+                                            min_length=min_length, do_sample=do_sample)
+                timer.lap("generate")
+            summaries.extend(summary.strip() for summary in tokenizer.batch_decode(output_ids, skip_special_tokens=True))
+            timer.lap("decode")
+            self.metrics.add_model_call(timer, batch_size=len(batch),
+                                        input_tokens=int(inputs["attention_mask"].sum()),
+                                        output_tokens=int((output_ids != tokenizer.pad_token_id).sum()))
+        return summaries
+
+    def summarize(self, text, max_length=50, min_length=25, do_sample=False, progress_callback=None):
+        with self.metrics.request("summarize", input_chars=len(text)) as record:
+            # Sampled calls are meant to vary between clicks, so they skip the cache
+            if do_sample or self.cache is None:
+                record["cache"] = "skip"
+                return self._generate_summary(text, max_length, min_length, do_sample, progress_callback)
+
+            # Long documents summarize differently under each chunking mode, so the mode is part of the key
+            key = self.cache.make_key(text, self.model_id, max_length=max_length, min_length=min_length,
+                                      do_sample=do_sample, incremental=self.incremental)
+            summary = self.cache.get(key)
+            record["cache"] = "miss" if summary is None else "hit"
+            if summary is None:
+                self.wait_until_ready()
+                started = time.perf_counter()
+                summary = self._generate_summary(text, max_length, min_length, do_sample, progress_callback)
+                self.cache.put(key, summary, time.perf_counter() - started)
+            return summary
+
+    def _generate_summary(self, text, max_length, min_length, do_sample, progress_callback):
+        # Documents longer than the model window go through the map-reduce path instead of being cut off
+        if self.count_tokens(text) > CHUNK_TOKENS:
+            return self.summarize_long(text, max_length=max_length, min_length=min_length,
+                                       do_sample=do_sample, progress_callback=progress_callback)
         # Method that interacts with the encapsulated model to summarize the text
-        summary = self._summarizer_model(text, max_length=max_length, min_length=min_length, do_sample=do_sample)
-        return summary[0]['summary_text']
+        return self._run_model([text], max_length, min_length, do_sample)[0]
+
+    def summarize_batch(self, texts, max_length=50, min_length=25, batch_size=CHUNK_BATCH_SIZE):
+        # Cached inputs are answered directly and over-long ones take the map-reduce path;
+        # everything else goes through the model in padded batches
+        with self.metrics.request("summarize_batch", batch_size=len(texts),
+                                  input_chars=sum(len(text) for text in texts)) as record:
+            summaries = [None] * len(texts)
+            keys = [None] * len(texts)
+            pending = []
+            for index, text in enumerate(texts):
+                if self.cache is not None:
+                    keys[index] = self.cache.make_key(text, self.model_id, max_length=max_length,
+                                                      min_length=min_length, do_sample=False,
+                                                      incremental=self.incremental)
+                    summaries[index] = self.cache.get(keys[index])
+                if summaries[index] is None:
+                    pending.append(index)
+            record["cache"] = f"{len(texts) - len(pending)}/{len(texts)} hits"
+
+            short = [index for index in pending if self.count_tokens(texts[index]) <= CHUNK_TOKENS]
+            if short:
+                started = time.perf_counter()
+                results = self._run_model([texts[index] for index in short], max_length, min_length,
+                                          batch_size=batch_size)
+                seconds = (time.perf_counter() - started) / len(short)
+                for index, summary in zip(short, results):
+                    summaries[index] = summary
+                    if self.cache is not None:
+                        self.cache.put(keys[index], summary, seconds)
+
+            for index in pending:
+                if summaries[index] is None:
+                    summaries[index] = self.summarize(texts[index], max_length=max_length, min_length=min_length)
+            return summaries
+
+    def count_tokens(self, text):
+        _, tokenizer = self._model_and_tokenizer()
+        return len(tokenizer(text, add_special_tokens=False, verbose=False)['input_ids'])
+
+    def chunk_text(self, text, chunk_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+        # Split on sentence boundaries; a sentence longer than a whole chunk is cut on token boundaries
+        _, tokenizer = self._model_and_tokenizer()
+        pieces = []
+        for sentence in split_sentences(text):
+            token_ids = tokenizer(sentence, add_special_tokens=False, verbose=False)['input_ids']
+            if len(token_ids) <= chunk_tokens:
+                pieces.append((sentence, len(token_ids)))
+                continue
+            for start in range(0, len(token_ids), chunk_tokens):
+                piece_ids = token_ids[start:start + chunk_tokens]
+                pieces.append((tokenizer.decode(piece_ids), len(piece_ids)))
+
+        # Pack the pieces into chunks, carrying the trailing sentences of each chunk into the next one
+        chunks = []
+        current, current_tokens = [], 0
+        for piece, piece_tokens in pieces:
+            if current and current_tokens + piece_tokens > chunk_tokens:
+                chunks.append(" ".join(sentence for sentence, _ in current))
+                overlap, overlap_size = [], 0
+                for sentence, sentence_tokens in reversed(current):
+                    if overlap_size + sentence_tokens > overlap_tokens:
+                        break
+                    overlap.insert(0, (sentence, sentence_tokens))
+                    overlap_size += sentence_tokens
+                current, current_tokens = overlap, overlap_size
+            current.append((piece, piece_tokens))
+            current_tokens += piece_tokens
+        if current:
+            chunks.append(" ".join(sentence for sentence, _ in current))
+        return chunks
+
+    def summarize_long(self, text, max_length=50, min_length=25, do_sample=False,
+                       chunk_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS,
+                       batch_size=CHUNK_BATCH_SIZE, progress_callback=None):
+        combined = self.condense(text, chunk_tokens, overlap_tokens, batch_size, progress_callback)
+        return self._run_model([combined], max_length, min_length, do_sample)[0]
+
+    def chunk_paragraphs(self, text, chunk_tokens=CHUNK_TOKENS):
+        # Paragraphs are the units; text without blank lines falls back to sentences
+        paragraphs = [paragraph for paragraph in PARAGRAPH_BOUNDARY.split(text) if paragraph.strip()]
+        if len(paragraphs) <= 1:
+            paragraphs = split_sentences(text)
+        units = []
+        for paragraph in paragraphs:
+            paragraph = normalize_text(paragraph)
+            paragraph_tokens = self.count_tokens(paragraph)
+            if paragraph_tokens <= chunk_tokens:
+                units.append((paragraph, paragraph_tokens))
+            else:
+                units.extend((piece, self.count_tokens(piece)) for piece in self.chunk_text(paragraph, chunk_tokens, 0))
+
+        # A boundary only depends on the units since the previous one, so after an edit the chunking
+        # falls back into step at the next content-defined boundary
+        chunks = []
+        current, current_tokens = [], 0
+        for unit, unit_tokens in units:
+            if current and current_tokens + unit_tokens > chunk_tokens:
+                chunks.append(" ".join(current))
+                current, current_tokens = [], 0
+            current.append(unit)
+            current_tokens += unit_tokens
+            fingerprint = int(hashlib.sha1(unit.encode("utf-8")).hexdigest()[:8], 16)
+            if current_tokens >= INCREMENTAL_MIN_CHUNK_TOKENS and fingerprint % INCREMENTAL_BOUNDARY_MODULUS == 0:
+                chunks.append(" ".join(current))
+                current, current_tokens = [], 0
+        if current:
+            chunks.append(" ".join(current))
+        return chunks
+
+    def condense(self, text, chunk_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS,
+                 batch_size=CHUNK_BATCH_SIZE, progress_callback=None):
+        if self.incremental:
+            chunks = self.chunk_paragraphs(text, chunk_tokens)
+        else:
+            chunks = self.chunk_text(text, chunk_tokens, overlap_tokens)
+
+        # Chunk summaries are cached by content, so after a small edit only the changed chunks are summarized
+        partial_summaries = [None] * len(chunks)
+        keys = [None] * len(chunks)
+        if self.cache is not None:
+            for index, chunk in enumerate(chunks):
+                keys[index] = self.cache.make_key(chunk, self.model_id, max_length=CHUNK_SUMMARY_MAX_LENGTH,
+                                                  min_length=CHUNK_SUMMARY_MIN_LENGTH, do_sample=False)
+                partial_summaries[index] = self.cache.get(keys[index])
+        missing = [index for index, summary in enumerate(partial_summaries) if summary is None]
+        done = len(chunks) - len(missing)
+        self.metrics.annotate(chunks=len(chunks), reused_chunks=done)
+        if progress_callback and done:
+            progress_callback(done, len(chunks))
+
+        # Map step: summarize the remaining chunks a batch at a time, so memory stays bounded by the batch size
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            started = time.perf_counter()
+            summaries = self._run_model([chunks[index] for index in batch], CHUNK_SUMMARY_MAX_LENGTH,
+                                        CHUNK_SUMMARY_MIN_LENGTH)
+            seconds = (time.perf_counter() - started) / len(batch)
+            for index, summary in zip(batch, summaries):
+                partial_summaries[index] = summary
+                if self.cache is not None:
+                    self.cache.put(keys[index], summary, seconds)
+                done += 1
+                if progress_callback:
+                    progress_callback(done, len(chunks))
+
+        # The joined chunk summaries feed the reduce step; repeat while they still overflow the window.
+        # In incremental mode each chunk summary becomes a paragraph, so the next level reuses its chunks too.
+        combined = ("\n\n" if self.incremental else " ").join(partial_summaries)
+        if len(chunks) > 1 and self.count_tokens(combined) > chunk_tokens:
+            return self.condense(combined, chunk_tokens, overlap_tokens, batch_size, progress_callback)
+        return combined
+
+    def summarize_stream(self, text, max_length=50, min_length=25, do_sample=False, progress_callback=None):
+        # Yields the summary piece by piece as tokens are generated. Beam search only settles on its output
+        # at the end, so streaming decodes greedily (or samples) with a single beam.
+        self.wait_until_ready()
+        # One request covers the condense step too, so long documents report the same totals as summarize()
+        with self.metrics.request("stream", input_chars=len(text)) as record:
+            started = time.perf_counter()
+            key = None
+            if self.cache is not None and not do_sample:
+                key = self.cache.make_key(text, self.model_id, max_length=max_length, min_length=min_length,
+                                          do_sample=False, num_beams=1, incremental=self.incremental)
+                summary = self.cache.get(key)
+                if summary is not None:
+                    record["cache"] = "hit"
+                    yield summary
+                    return
+            record["cache"] = "miss" if key else "skip"
+
+            # Long documents are condensed first; only the final reduce step streams
+            source = text
+            if self.count_tokens(text) > CHUNK_TOKENS:
+                source = self.condense(text, progress_callback=progress_callback)
+
+            model, tokenizer = self._model_and_tokenizer()
+            timer = PhaseTimer()
+            inputs = tokenizer(source, return_tensors="pt", truncation=True).to(model.device)
+            timer.lap("tokenize")
+            streamer = self._streamer_class(tokenizer, skip_prompt=True, skip_special_tokens=True)
+            stop_requested = threading.Event()
+            errors = []
+
+            def stop_when_requested(input_ids, scores, **kwargs):
+                import torch
+                return torch.full((input_ids.shape[0],), stop_requested.is_set(), dtype=torch.bool,
+                                  device=input_ids.device)
+
+            def generate():
+                try:
+                    with self._inference_context():
+                        model.generate(**inputs, streamer=streamer, max_length=max_length, min_length=min_length,
+                                       do_sample=do_sample, num_beams=1, stopping_criteria=[stop_when_requested])
+                except Exception as error:
+                    errors.append(error)
+                    streamer.end()
+
+            thread = threading.Thread(target=generate, daemon=True)
+            thread.start()
+            pieces = []
+            try:
+                for piece in streamer:
+                    if piece:
+                        if "time_to_first_token" not in record:
+                            record["time_to_first_token"] = time.perf_counter() - started
+                        pieces.append(piece)
+                        yield piece
+            finally:
+                # Reached on completion and also when the consumer closes the generator early
+                stop_requested.set()
+                thread.join()
+                timer.lap("generate")
+                summary = "".join(pieces).strip()
+                output_tokens = len(tokenizer(summary, add_special_tokens=False)["input_ids"])
+                self.metrics.add_model_call(timer, batch_size=1, input_tokens=int(inputs["input_ids"].shape[1]),
+                                            output_tokens=output_tokens)
+            if errors:
+                raise errors[0]
+            if key is not None:
+                self.cache.put(key, summary, time.perf_counter() - started)
+
+    def rephrase(self, text, max_length=50, min_length=25, num_candidates=REPHRASE_CANDIDATES,
+                 progress_callback=None):
+        # Candidates are pooled per input; a new batch is only sampled once the pool runs dry
+        key = SummaryCache.make_key(text, self.model_id, max_length=max_length, min_length=min_length)
+        with self.metrics.request("rephrase", input_chars=len(text)) as record, self._rephrase_lock:
+            state = self._rephrase_state
+            if state is None or state["key"] != key:
+                state = {"key": key, "encoder_states": None, "attention_mask": None, "candidates": []}
+                self._rephrase_state = state
+            record["cache"] = "hit" if state["candidates"] else "miss"
+            if not state["candidates"]:
+                state["candidates"] = self._sample_candidates(state, text, max_length, min_length,
+                                                              num_candidates, progress_callback)
+            return state["candidates"].pop(0)
+
+    def _sample_candidates(self, state, text, max_length, min_length, num_candidates, progress_callback):
+        model, tokenizer = self._model_and_tokenizer()
+        timer = PhaseTimer()
+        with self._inference_context():
+            # The encoder runs once per input; later samples reuse its hidden states
+            if state["encoder_states"] is None:
+                source = text
+                if self.count_tokens(text) > CHUNK_TOKENS:
+                    source = self.condense(text, progress_callback=progress_callback)
+                    # The condense step's model calls are already counted in the request
+                    timer = PhaseTimer()
+                inputs = tokenizer(source, return_tensors="pt", truncation=True).to(model.device)
+                timer.lap("tokenize")
+                state["attention_mask"] = inputs["attention_mask"]
+                state["encoder_states"] = model.get_encoder()(
+                    input_ids=inputs["input_ids"], attention_mask=inputs["attention_mask"]).last_hidden_state
+                timer.lap("encode")
+
+            # generate() expands the encoder outputs in place, so every call gets a fresh wrapper
+            encoder_outputs = self._encoder_output_class(last_hidden_state=state["encoder_states"])
+            output_ids = model.generate(encoder_outputs=encoder_outputs,
+                                        attention_mask=state["attention_mask"], do_sample=True, num_beams=1,
+                                        num_return_sequences=num_candidates, max_length=max_length,
+                                        min_length=min_length)
+            timer.lap("generate")
+        candidates = []
+        for candidate in tokenizer.batch_decode(output_ids, skip_special_tokens=True):
+            candidate = candidate.strip()
+            if candidate not in candidates:
+                candidates.append(candidate)
+        timer.lap("decode")
+        self.metrics.add_model_call(timer, batch_size=num_candidates,
+                                    input_tokens=int(state["attention_mask"].sum()),
+                                    output_tokens=int((output_ids != tokenizer.pad_token_id).sum()))
+        return candidates
+
+# Client for summarizer_server.py: same calls as Summarizer, but the model lives in a shared server process
+class RemoteSummarizer:
+    RETRIES = 5
+
+    def __init__(self, url, timeout=300):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def summarize(self, text, max_length=50, min_length=25, do_sample=False, progress_callback=None):
+        payload = json.dumps({"text": text, "max_length": max_length, "min_length": min_length,
+                              "do_sample": do_sample}).encode("utf-8")
+        for attempt in range(self.RETRIES):
+            request = urllib.request.Request(self.url + "/summarize", data=payload,
+                                             headers={"Content-Type": "application/json"})
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    return json.loads(response.read())["summary"]
+            except urllib.error.HTTPError as error:
+                # 503 means the server queue is full; back off and try again
+                if error.code != 503 or attempt == self.RETRIES - 1:
+                    message = json.loads(error.read() or b"{}").get("error", error.reason)
+                    raise RuntimeError(f"Summarization server error: {message}") from None
+                time.sleep(0.5 * 2 ** attempt)
+
+    def rephrase(self, text, max_length=50, min_length=25, progress_callback=None):
+        return self.summarize(text, max_length=max_length, min_length=min_length, do_sample=True)
+
+    def summarize_stream(self, text, max_length=50, min_length=25, do_sample=False, progress_callback=None):
+        # The server answers whole summaries, so the stream is a single piece
+        yield self.summarize(text, max_length=max_length, min_length=min_length, do_sample=do_sample)
+
+    def is_available(self):
+        try:
+            with urllib.request.urlopen(self.url + "/health", timeout=5) as response:
+                return json.loads(response.read()).get("status") == "ok"
+        except (OSError, ValueError):
+            return False
+
+
+# Background executor: runs model jobs off the Tk main thread and hands the results back through root.after
+class InferenceWorker:
+    POLL_INTERVAL_MS = 30
+
+    def __init__(self, root):
+        self.root = root
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        self._latest_job_id = 0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self.root.after(self.POLL_INTERVAL_MS, self._poll_results)
+
+    def submit(self, job, on_done, on_error=None, on_progress=None, on_partial=None):
+        # Every new job supersedes the ones submitted before it
+        with self._lock:
+            self._latest_job_id += 1
+            job_id = self._latest_job_id
+        self._jobs.put((job_id, job, on_done, on_error, on_progress, on_partial))
+        return job_id
+
+    def cancel(self):
+        # Bumping the id drops pending jobs and discards the result of the running one
+        with self._lock:
+            self._latest_job_id += 1
+
+    def is_current(self, job_id):
+        with self._lock:
+            return job_id == self._latest_job_id
+
+    def _run(self):
+        while True:
+            job_id, job, on_done, on_error, on_progress, on_partial = self._jobs.get()
+            if not self.is_current(job_id):
+                continue
+
+            def report(*args, job_id=job_id, on_progress=on_progress):
+                self._results.put((job_id, on_progress, args))
+
+            try:
+                result = job(report)
+                # Generator jobs stream their pieces; closing a superseded one stops its generation early
+                if inspect.isgenerator(result):
+                    for piece in result:
+                        if not self.is_current(job_id):
+                            result.close()
+                            break
+                        self._results.put((job_id, on_partial, (piece,)))
+                    result = None
+            except Exception as error:
+                self._results.put((job_id, on_error, (error,)))
+            else:
+                self._results.put((job_id, on_done, (result,)))
+
+    def _poll_results(self):
+        # Runs on the Tk thread, so the callbacks are free to touch widgets
+        while True:
+            try:
+                job_id, callback, args = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if callback and self.is_current(job_id):
+                callback(*args)
+        self.root.after(self.POLL_INTERVAL_MS, self._poll_results)
 
 # Base class for the application's GUI
 class AppWindow:
     def __init__(self, root):
         self.root = root
         self.root.title("Text Summarizer Application")
-        self.root.geometry("500x400")
+        self.root.geometry("500x450")
 
     def display(self):
         self.root.mainloop()
 
 # Multiple inheritance: App inherits from both Summarizer and AppWindow
 class TextSummarizationApp(AppWindow, Summarizer):
-    def __init__(self, root):
+    def __init__(self, root, server_url=None, **summarizer_options):
         # Calling parent constructors: demonstrating polymorphism
         AppWindow.__init__(self, root)
-        Summarizer.__init__(self)
+        # The model loads once the window is up, so it does not hold up the first paint
+        Summarizer.__init__(self, preload=False, **summarizer_options)
+        # Model calls go either to this instance or to a shared summarization server
+        self.client = RemoteSummarizer(server_url) if server_url else self
 
         # Main GUI components
         self.input_text = tk.Text(self.root, height=10, width=50)
@@ -41,6 +934,11 @@ class TextSummarizationApp(AppWindow, Summarizer):
         self.summarize_button = tk.Button(self.root, text="Summarize", command=self.summarize_text)
         self.summarize_button.pack(pady=10)
 
+        # Streaming shows the summary as it is generated, using greedy decoding instead of beam search
+        self.stream_output = tk.BooleanVar(value=True)
+        self.stream_checkbox = tk.Checkbutton(self.root, text="Stream output", variable=self.stream_output)
+        self.stream_checkbox.pack()
+
         # Rephrase button
         self.rephrase_button = tk.Button(self.root, text="Rephrase", command=self.rephrase_text)
         self.rephrase_button.pack(pady=5)
@@ -52,6 +950,14 @@ class TextSummarizationApp(AppWindow, Summarizer):
         self.summary_output = tk.Text(self.root, height=5, width=50)
         self.summary_output.pack()
 
+        # Status line used for chunk progress on long documents
+        self.status_label = tk.Label(self.root, text="")
+        self.status_label.pack(pady=5)
+
+        # Model status indicator, updated while the warm-up thread loads the weights
+        self.model_status_label = tk.Label(self.root, text="Loading model...", fg="gray")
+        self.model_status_label.pack()
+
         # Adding "About" and "How to Use" sections
         menu = tk.Menu(self.root)
         self.root.config(menu=menu)
@@ -60,32 +966,137 @@ class TextSummarizationApp(AppWindow, Summarizer):
         menu.add_cascade(label="Help", menu=about_menu)
         about_menu.add_command(label="About", command=self.show_about)
         about_menu.add_command(label="How to Use", command=self.show_how_to_use)
+        about_menu.add_command(label="Cache Statistics", command=self.show_cache_stats)
+        about_menu.add_command(label="Export Metrics...", command=self.export_metrics)
+
+        # Model calls run on a background worker so the window stays responsive
+        self.worker = InferenceWorker(self.root)
+        self._button_labels = {self.summarize_button: "Summarize", self.rephrase_button: "Rephrase"}
+
+        if self.client is self:
+            self.root.after_idle(self.start_loading)
+            self.root.after(200, self.update_model_status)
+        else:
+            self.root.after_idle(self.check_server)
+
+    def check_server(self):
+        # Health check on its own thread so a slow server does not freeze the window. It stays off the worker,
+        # where a Summarize click before it returns would supersede it and its result would be dropped.
+        result = queue.Queue()
+        threading.Thread(target=lambda: result.put(self.client.is_available()), daemon=True).start()
+        self.root.after(200, self.poll_server_status, result)
+
+    def poll_server_status(self, result):
+        try:
+            available = result.get_nowait()
+        except queue.Empty:
+            self.root.after(200, self.poll_server_status, result)
+            return
+        self.show_server_status(available)
+
+    def show_server_status(self, available):
+        if available:
+            self.model_status_label.config(text=f"Using server at {self.client.url}", fg="green")
+        else:
+            self.model_status_label.config(text=f"Server at {self.client.url} is not reachable", fg="red")
+
+    def update_model_status(self):
+        if not self._model_ready.is_set():
+            self.root.after(200, self.update_model_status)
+        elif self.model_error is not None:
+            self.model_status_label.config(text="Model failed to load", fg="red")
+        else:
+            self.model_status_label.config(text="Model ready", fg="green")
 
     # Method overriding: Redefining the command functionality for summarize_button
     def summarize_text(self):
         input_text = self.input_text.get("1.0", tk.END)
         if input_text.strip():
-            summary = self.summarize(input_text)
-            self.summary_output.delete("1.0", tk.END)
-            self.summary_output.insert(tk.END, summary)
+            if self.stream_output.get():
+                self.summary_output.delete("1.0", tk.END)
+                self.run_in_background(self.summarize_button, "Summarizing...",
+                                       lambda report: self.client.summarize_stream(input_text,
+                                                                                  progress_callback=report))
+            else:
+                self.run_in_background(self.summarize_button, "Summarizing...",
+                                       lambda report: self.client.summarize(input_text, progress_callback=report))
         else:
             messagebox.showerror("Error", "Input text cannot be empty!")
 
     def rephrase_text(self):
         input_text = self.input_text.get("1.0", tk.END)
         if input_text.strip():
-            # Rephrasing uses do_sample=True for random sampling-based variation
-            summary = self.summarize(input_text, max_length=50, min_length=25, do_sample=True)
-            self.summary_output.delete("1.0", tk.END)
-            self.summary_output.insert(tk.END, summary)
+            # Rephrasing samples several variations at once and cycles through them on later clicks
+            self.run_in_background(self.rephrase_button, "Rephrasing...",
+                                   lambda report: self.client.rephrase(input_text, max_length=50, min_length=25,
+                                                                       progress_callback=report))
         else:
             messagebox.showerror("Error", "Input text cannot be empty!")
 
+    def run_in_background(self, button, busy_label, job):
+        # A new request replaces whatever is still pending, so only the latest click produces output
+        self.set_busy(button, busy_label)
+        self.worker.submit(job, on_done=self.show_summary, on_error=self.show_error,
+                           on_progress=self.show_progress, on_partial=self.append_summary)
+
+    def show_summary(self, summary):
+        self.clear_busy()
+        # Streamed jobs have already written their output piece by piece
+        if summary is not None:
+            self.summary_output.delete("1.0", tk.END)
+            self.summary_output.insert(tk.END, summary)
+
+    def append_summary(self, piece):
+        self.status_label.config(text="")
+        self.summary_output.insert(tk.END, piece)
+        self.summary_output.see(tk.END)
+
+    def show_error(self, error):
+        self.clear_busy()
+        messagebox.showerror("Error", f"Summarization failed: {error}")
+
+    def show_progress(self, done, total):
+        self.status_label.config(text=f"Summarized chunk {done} of {total}")
+
+    def set_busy(self, button, busy_label):
+        self.clear_busy()
+        button.config(text=busy_label, relief=tk.SUNKEN)
+        self.root.config(cursor="watch")
+
+    def clear_busy(self):
+        for button, label in self._button_labels.items():
+            button.config(text=label, relief=tk.RAISED)
+        self.root.config(cursor="")
+        self.status_label.config(text="")
+
     def clear_text(self):
-        # Clear both input and output text areas
+        # Clear both input and output text areas and drop any request still in flight
+        self.worker.cancel()
+        self.clear_busy()
         self.input_text.delete("1.0", tk.END)
         self.summary_output.delete("1.0", tk.END)
 
+    def show_cache_stats(self):
+        if self.cache is None:
+            messagebox.showinfo("Cache Statistics", "The summary cache is disabled.")
+            return
+        stats = self.cache.stats()
+        messagebox.showinfo("Cache Statistics",
+                            f"Memory hits: {stats['memory_hits']}\n"
+                            f"Disk hits: {stats['disk_hits']}\n"
+                            f"Misses: {stats['misses']}\n"
+                            f"Hit rate: {stats['hit_rate']:.0%}\n"
+                            f"Model time saved: {stats['seconds_saved']:.1f} s")
+
+    def export_metrics(self):
+        path = filedialog.asksaveasfilename(title="Export Metrics", defaultextension=".json",
+                                            filetypes=[("JSON", "*.json"), ("CSV", "*.csv")])
+        if path:
+            try:
+                self.metrics.export(path)
+            except OSError as error:
+                messagebox.showerror("Error", f"Could not export metrics: {error}")
+
     @staticmethod
     def show_about():
         # About Section
@@ -100,12 +1111,14 @@ class TextSummarizationApp(AppWindow, Summarizer):
                                           "4. Click the 'Rephrase' button to get a different version of the summary.\n"
                                           "5. Use the 'Clear' button to reset everything.")
 
-# Decorator for additional functionality (e.g., logging user input length)
+# Decorator for additional functionality: records each button press with its input length in the metrics
 def input_logger(func):
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
         instance = args[0]
-        input_text = instance.input_text.get("1.0", tk.END)
-        print(f"User entered {len(input_text.strip())} characters.")
+        input_chars = len(instance.input_text.get("1.0", tk.END).strip())
+        logger.info("%s: user entered %d characters", func.__name__, input_chars)
+        instance.metrics.record(f"ui.{func.__name__}", input_chars=input_chars)
         return func(*args, **kwargs)
     return wrapper
 
@@ -119,8 +1132,456 @@ class EnhancedTextSummarizationApp(TextSummarizationApp):
     def rephrase_text(self):
         super().rephrase_text()
 
-# Main application start
-if __name__ == "__main__":
+# Reading JSONL records ({"id": ..., "text": ...}); lines that are not JSON objects are taken as plain documents
+def read_jsonl_documents(lines):
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        if isinstance(record, dict):
+            doc_id, text = str(record.get("id", line_number)), record.get("text", "")
+            if not isinstance(text, str):
+                # null, numbers and nested values have nothing to summarize
+                print(f"Skipping document {doc_id}: 'text' is not a string", file=sys.stderr)
+                continue
+            yield doc_id, text
+        else:
+            yield str(line_number), line
+
+
+# Streaming documents from a directory of .txt files, a JSONL file or stdin ("-"), one at a time
+def read_documents(source):
+    if source == "-":
+        yield from read_jsonl_documents(sys.stdin)
+    elif os.path.isdir(source):
+        for directory, subdirectories, filenames in os.walk(source):
+            subdirectories.sort()
+            for filename in sorted(filenames):
+                if filename.endswith(".txt"):
+                    path = os.path.join(directory, filename)
+                    with open(path, encoding="utf-8", errors="replace") as file:
+                        yield os.path.relpath(path, source), file.read()
+    else:
+        with open(source, encoding="utf-8") as file:
+            yield from read_jsonl_documents(file)
+
+
+# Ids already written to an output file, so an interrupted run can pick up where it stopped
+def read_checkpoint(path):
+    done = set()
+    if path == "-" or not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and "summary" in record:
+                done.add(str(record["id"]))
+    return done
+
+
+# An interrupted run can leave half a record at the end of the file; cut it off so appended records start on
+# their own line
+def drop_partial_line(path):
+    if path == "-" or not os.path.exists(path):
+        return
+    with open(path, "rb+") as file:
+        size = file.seek(0, os.SEEK_END)
+        # Scanning back from the end in blocks, since a finished file only needs its last byte checked
+        end = size
+        while end > 0:
+            start = max(0, end - 4096)
+            file.seek(start)
+            newline = file.read(end - start).rfind(b"\n")
+            if newline != -1:
+                end = start + newline + 1
+                break
+            end = start
+        if end < size:
+            file.truncate(end)
+
+
+# Packing length-sorted documents into batches whose padded token count stays within the budget
+def make_batches(documents, batch_tokens=BULK_BATCH_TOKENS, max_batch_size=BULK_MAX_BATCH_SIZE):
+    batch = []
+    for document in sorted(documents, key=lambda document: document[2]):
+        padded_size = (len(batch) + 1) * document[2]
+        if batch and (padded_size > batch_tokens or len(batch) >= max_batch_size):
+            yield batch
+            batch = []
+        batch.append(document)
+    if batch:
+        yield batch
+
+
+# Summarizing one batch into output records; used in-process and by the pool workers
+def summarize_records(summarizer, batch, max_length, min_length):
+    texts = [text for _, text, _ in batch]
+    try:
+        summaries = summarizer.summarize_batch(texts, max_length=max_length, min_length=min_length,
+                                               batch_size=len(batch))
+        return [{"id": doc_id, "summary": summary} for (doc_id, _, _), summary in zip(batch, summaries)]
+    except Exception:
+        # Retry one at a time so a single bad document does not sink the whole batch
+        records = []
+        for doc_id, text, _ in batch:
+            try:
+                records.append({"id": doc_id, "summary": summarizer.summarize(
+                    text, max_length=max_length, min_length=min_length)})
+            except Exception as error:
+                records.append({"id": doc_id, "error": str(error)})
+        return records
+
+
+def summarize_documents(summarizer, documents, output, max_length=50, min_length=25, skip_ids=(),
+                        window=BULK_WINDOW_DOCUMENTS, batch_tokens=BULK_BATCH_TOKENS,
+                        max_batch_size=BULK_MAX_BATCH_SIZE, pool=None, progress_callback=None):
+    # Only one window of documents is held in memory; results are written and flushed batch by batch
+    def windows():
+        window_documents = []
+        for doc_id, text in documents:
+            if doc_id in skip_ids or not text.strip():
+                continue
+            window_documents.append((doc_id, text, summarizer.count_tokens(text)))
+            if len(window_documents) >= window:
+                yield window_documents
+                window_documents = []
+        if window_documents:
+            yield window_documents
+
+    def batches():
+        for window_documents in windows():
+            yield from make_batches(window_documents, batch_tokens, max_batch_size)
+
+    if pool is None:
+        results = (summarize_records(summarizer, batch, max_length, min_length) for batch in batches())
+    else:
+        results = pool.imap_unordered(batches(), max_length, min_length)
+
+    written = 0
+    for records in results:
+        for record in records:
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        output.flush()
+        written += len(records)
+        if progress_callback:
+            progress_callback(written)
+    return written
+
+
+# Private (unshared) memory of a process in MB, read from /proc; None where that is not available
+def private_memory_mb(pid):
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", encoding="ascii") as file:
+            private_kb = sum(int(line.split()[1]) for line in file if line.startswith(("Private_Clean", "Private_Dirty")))
+    except (OSError, ValueError, IndexError):
+        return None
+    return private_kb / 1024
+
+
+# Worker loop of SummarizerPool; runs in a forked child that inherited the parent's loaded model
+def _pool_worker(summarizer, tasks, results, threads):
+    import torch
+
+    # Each worker gets its own slice of the cores instead of every worker spinning up a full thread pool
+    torch.set_num_threads(threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, batch, max_length, min_length = task
+        # Metrics recorded here stay in this process, so they go back to the parent with the results
+        summarizer.metrics.records.clear()
+        records = summarize_records(summarizer, batch, max_length, min_length)
+        results.put((task_id, records, list(summarizer.metrics.records)))
+
+
+# Multi-process execution for bulk jobs. The model is loaded once in the parent and the workers are forked
+# from it, so the read-only weights are shared copy-on-write instead of loaded again per process. Batches sit
+# in one shared queue and idle workers take the next one, so a worker stuck on a long batch never holds up
+# work the others could be doing.
+class SummarizerPool:
+    def __init__(self, summarizer, workers=None, threads_per_worker=None, max_pending=None):
+        import gc
+        import multiprocessing
+
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise RuntimeError("SummarizerPool needs the fork start method, which this platform does not support")
+        summarizer.wait_until_ready()
+        self.summarizer = summarizer
+        cores = os.cpu_count() or 1
+        self.workers = workers or cores
+        self.threads_per_worker = threads_per_worker or max(1, cores // self.workers)
+        self.max_pending = max_pending or self.workers * 2
+
+        context = multiprocessing.get_context("fork")
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        # Moving everything allocated so far out of the collector's reach keeps the GC from writing to
+        # (and so copying) the pages the workers share with the parent
+        gc.collect()
+        gc.freeze()
+        self._processes = [context.Process(target=_pool_worker, daemon=True,
+                                           args=(summarizer, self._tasks, self._results, self.threads_per_worker))
+                           for _ in range(self.workers)]
+        for process in self._processes:
+            process.start()
+        gc.unfreeze()
+
+    def imap_unordered(self, batches, max_length, min_length):
+        # Keeps at most max_pending batches in flight, so input is only read as fast as the workers consume it
+        pending = set()
+        for task_id, batch in enumerate(batches):
+            while len(pending) >= self.max_pending:
+                yield self._collect(pending)
+            self._tasks.put((task_id, batch, max_length, min_length))
+            pending.add(task_id)
+        while pending:
+            yield self._collect(pending)
+
+    def _collect(self, pending):
+        while True:
+            try:
+                task_id, records, metrics = self._results.get(timeout=1)
+            except queue.Empty:
+                if not all(process.is_alive() for process in self._processes):
+                    raise RuntimeError("A summarizer pool worker exited unexpectedly")
+                continue
+            pending.discard(task_id)
+            self.summarizer.metrics.add_records(metrics)
+            return records
+
+    def memory_report(self):
+        return {process.pid: private_memory_mb(process.pid) for process in self._processes}
+
+    def close(self):
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Headless entry point: summarize a whole corpus without opening the GUI
+def run_batch(args):
+    summarizer = Summarizer(**summarizer_options(args))
+    summarizer.wait_until_ready()
+
+    skip_ids = set()
+    if not args.restart:
+        drop_partial_line(args.output)
+        skip_ids = read_checkpoint(args.output)
+    if skip_ids:
+        print(f"Resuming: {len(skip_ids)} documents already summarized", file=sys.stderr)
+
+    started = time.perf_counter()
+
+    def report(written):
+        elapsed = time.perf_counter() - started
+        print(f"\rSummarized {written} documents ({written / elapsed:.2f} docs/s)", end="", file=sys.stderr)
+
+    pool = None
+    if args.workers > 1:
+        pool = SummarizerPool(summarizer, workers=args.workers, threads_per_worker=args.threads_per_worker)
+        print(f"Started {pool.workers} workers with {pool.threads_per_worker} torch threads each", file=sys.stderr)
+
+    if args.output == "-":
+        output = sys.stdout
+    else:
+        output = open(args.output, "w" if args.restart else "a", encoding="utf-8")
+    try:
+        written = summarize_documents(summarizer, read_documents(args.input), output,
+                                      max_length=args.max_length, min_length=args.min_length,
+                                      skip_ids=skip_ids, window=args.window, batch_tokens=args.batch_tokens,
+                                      max_batch_size=args.max_batch_size, pool=pool, progress_callback=report)
+        if pool is not None:
+            memory = [f"{megabytes:.0f} MB" for megabytes in pool.memory_report().values() if megabytes is not None]
+            if memory:
+                print(f"\nWorker private memory: {', '.join(memory)}", end="", file=sys.stderr)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        if pool is not None:
+            pool.close()
+    print(f"\nDone: {written} documents in {time.perf_counter() - started:.1f} s", file=sys.stderr)
+    if args.metrics_out:
+        summarizer.metrics.export(args.metrics_out)
+    return 0
+
+
+# Sample used to compare backends: a news-style passage of roughly 400 tokens
+BACKEND_SAMPLE_TEXT = (
+    "The city council voted on Tuesday to approve a new public transport plan that will add three bus routes "
+    "and extend the light rail line to the northern suburbs by 2027. The plan, which has been under discussion "
+    "for more than two years, is expected to cost 480 million dollars, with most of the funding coming from a "
+    "combination of state grants and a modest increase in local property taxes. Supporters argue that the "
+    "expansion will reduce traffic congestion, cut emissions and give residents in fast-growing neighbourhoods "
+    "better access to jobs in the city centre. Opponents, including several small business groups, say the tax "
+    "increase comes at a difficult time and that the council has underestimated construction costs. The mayor "
+    "said the council had consulted widely and that independent reviews supported the cost estimates. Work on "
+    "the first bus route is scheduled to begin early next year, while the rail extension will require further "
+    "environmental assessments before construction can start. Residents will be able to comment on the detailed "
+    "route maps at a series of public meetings over the coming months. Transport officials said ridership on "
+    "existing lines had recovered to pre-pandemic levels and that demand in the northern suburbs was now the "
+    "highest in the network, with peak-hour services regularly running at full capacity. The council also "
+    "approved a review of parking fees in the city centre, which will report back in six months."
+)
+
+
+# Runs in a fresh process per backend, so load time and peak memory are not polluted by the others
+def benchmark_backend(options, texts, repeats):
+    baseline_rss = peak_rss_mb()
+    started = time.perf_counter()
+    summarizer = Summarizer(use_cache=False, **options)
+    summarizer.wait_until_ready()
+    load_seconds = time.perf_counter() - started
+    loaded_rss = peak_rss_mb()
+
+    # One warm-up call so lazy initialization is not counted as latency
+    summarizer.summarize(texts[0])
+    latencies = []
+    for _ in range(repeats):
+        for text in texts:
+            started = time.perf_counter()
+            summarizer.summarize(text)
+            latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return {
+        "backend": options.get("backend", "default"),
+        "model": summarizer.model_name,
+        "load_seconds": load_seconds,
+        "mean_latency_seconds": sum(latencies) / len(latencies),
+        "median_latency_seconds": latencies[len(latencies) // 2],
+        "peak_rss_mb": peak_rss_mb(),
+        "load_rss_mb": loaded_rss - baseline_rss if loaded_rss is not None else None,
+    }
+
+
+def run_compare(args):
+    import multiprocessing
+
+    base_options = summarizer_options(args)
+    context = multiprocessing.get_context("spawn")
+    rows = []
+    for backend in args.backends.split(","):
+        options = dict(base_options, backend=backend.strip())
+        # default and int8 share the full-size checkpoint; the distilled backend has its own
+        options["model_path"] = args.distilled_path if options["backend"] == "distilled" else args.model_path
+        print(f"Benchmarking {options['backend']}...", file=sys.stderr)
+        with context.Pool(1) as pool:
+            try:
+                rows.append(pool.apply(benchmark_backend, (options, [BACKEND_SAMPLE_TEXT], args.repeats)))
+            except Exception as error:
+                print(f"  {options['backend']} failed: {error}", file=sys.stderr)
+
+    print(f"{'backend':<10} {'load s':>8} {'mean s':>8} {'median s':>9} {'load MB':>9} {'peak MB':>8}  model")
+    for row in rows:
+        load_mb = f"{row['load_rss_mb']:.0f}" if row["load_rss_mb"] is not None else "n/a"
+        peak_mb = f"{row['peak_rss_mb']:.0f}" if row["peak_rss_mb"] is not None else "n/a"
+        print(f"{row['backend']:<10} {row['load_seconds']:>8.2f} {row['mean_latency_seconds']:>8.3f} "
+              f"{row['median_latency_seconds']:>9.3f} {load_mb:>9} {peak_mb:>8}  {row['model']}")
+    return 0 if rows else 1
+
+
+def summarizer_options(args):
+    return {
+        "backend": args.backend,
+        "model_path": args.model_path,
+        "intra_op_threads": args.threads,
+        "inter_op_threads": args.interop_threads,
+        "inference_mode": not args.no_inference_mode,
+        "offline": args.offline,
+        "incremental": args.chunking == "paragraph",
+    }
+
+
+# Backend options shared by the app, the batch CLI and summarizer_server.py
+def add_backend_arguments(parser):
+    parser.add_argument("--backend", choices=BACKENDS, default="default",
+                        help="inference backend: full precision, int8 dynamic quantization or distilled model")
+    parser.add_argument("--model-path", help="local model directory or hub id to load instead of the default")
+    parser.add_argument("--threads", type=int, help="torch intra-op thread count")
+    parser.add_argument("--interop-threads", type=int, help="torch inter-op thread count")
+    parser.add_argument("--no-inference-mode", action="store_true",
+                        help="run under torch.no_grad instead of torch.inference_mode")
+    parser.add_argument("--offline", action="store_true", help="only use locally cached model files")
+    parser.add_argument("--chunking", choices=CHUNKING_MODES, default="paragraph",
+                        help="long-document chunks: paragraph (reuses cached chunks after edits) or overlapping "
+                             "sentence chunks")
+
+
+# Time from process start until the window has been drawn
+def measure_startup(root):
+    root.update()
+    return time.perf_counter() - PROCESS_START
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Text Summarizer Application")
+    parser.add_argument("--startup-check", action="store_true",
+                        help=f"open the window, report the startup time and fail if it exceeds {STARTUP_BUDGET_SECONDS}s")
+    parser.add_argument("--server", metavar="URL",
+                        help="use a running summarizer_server.py (e.g. http://127.0.0.1:8765) instead of a local model")
+    add_backend_arguments(parser)
+    subparsers = parser.add_subparsers(dest="command")
+
+    batch_parser = subparsers.add_parser("batch", help="summarize documents without the GUI")
+    batch_parser.add_argument("input", help="directory of .txt files, JSONL file, or - for stdin")
+    batch_parser.add_argument("-o", "--output", default="-",
+                              help="JSONL output file; an existing file is resumed (default: stdout)")
+    batch_parser.add_argument("--restart", action="store_true", help="overwrite the output instead of resuming")
+    batch_parser.add_argument("--max-length", type=int, default=50)
+    batch_parser.add_argument("--min-length", type=int, default=25)
+    batch_parser.add_argument("--window", type=int, default=BULK_WINDOW_DOCUMENTS,
+                              help="documents read ahead and length-sorted at a time")
+    batch_parser.add_argument("--batch-tokens", type=int, default=BULK_BATCH_TOKENS,
+                              help="upper bound on padded tokens per batch")
+    batch_parser.add_argument("--max-batch-size", type=int, default=BULK_MAX_BATCH_SIZE)
+    batch_parser.add_argument("--workers", type=int, default=1,
+                              help="worker processes sharing the parent's model weights (default: 1, no pool)")
+    batch_parser.add_argument("--threads-per-worker", type=int,
+                              help="torch threads per worker (default: cores divided by workers)")
+    batch_parser.add_argument("--metrics-out", help="write per-request metrics to this .json or .csv file")
+
+    compare_parser = subparsers.add_parser("compare", help="report latency and memory for each backend")
+    compare_parser.add_argument("--backends", default=",".join(BACKENDS),
+                                help="comma-separated backends to compare")
+    compare_parser.add_argument("--distilled-path",
+                                help="distilled checkpoint for the distilled backend (--model-path is used for the others)")
+    compare_parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if args.command == "batch":
+        return run_batch(args)
+    if args.command == "compare":
+        return run_compare(args)
+
     root = tk.Tk()
-    app = EnhancedTextSummarizationApp(root)
+    app = EnhancedTextSummarizationApp(root, server_url=args.server, **summarizer_options(args))
+    if args.startup_check:
+        elapsed = measure_startup(root)
+        print(f"Window shown after {elapsed * 1000:.0f} ms (budget {STARTUP_BUDGET_SECONDS * 1000:.0f} ms)")
+        root.destroy()
+        return 0 if elapsed <= STARTUP_BUDGET_SECONDS else 1
     app.display()
+    return 0
+
+
+# Main application start
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    sys.exit(main())
@@ -0,0 +1,258 @@
+# Github: https://github.com/19rafsan97/HIT137_Assignment_3
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from summarizer_app import Summarizer, SummaryCache, add_backend_arguments, summarizer_options
+
+# Requests arriving within this window are summarized together in one batch
+BATCH_WINDOW_MS = 10
+MAX_BATCH_SIZE = 8
+# Requests waiting beyond this are turned away with 503 so clients back off
+MAX_QUEUED_REQUESTS = 256
+MAX_BODY_BYTES = 10 * 1024 * 1024
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class ServerBusy(Exception):
+    pass
+
+
+# Gathers concurrent requests into micro-batches and merges identical in-flight inputs into one computation
+class MicroBatcher:
+    def __init__(self, summarizer, batch_window_ms=BATCH_WINDOW_MS, max_batch_size=MAX_BATCH_SIZE,
+                 max_queued=MAX_QUEUED_REQUESTS):
+        self.summarizer = summarizer
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._queue = asyncio.Queue(maxsize=max_queued)
+        self._in_flight = {}
+        # A single model thread: batches run one after another while the event loop keeps accepting requests
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self.requests = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.batches = 0
+        self.batched_requests = 0
+
+    async def summarize(self, text, max_length, min_length, do_sample):
+        self.requests += 1
+        loop = asyncio.get_running_loop()
+        # Sampled requests are meant to differ, so only deterministic ones are merged
+        key = None
+        if not do_sample:
+            key = SummaryCache.make_key(text, self.summarizer.model_id, max_length=max_length,
+                                        min_length=min_length, do_sample=False)
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return await asyncio.shield(future)
+
+        future = loop.create_future()
+        try:
+            self._queue.put_nowait((key, text, (max_length, min_length, do_sample), future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise ServerBusy() from None
+        if key is not None:
+            self._in_flight[key] = future
+        # Shielded so one client disconnecting does not cancel the result for the others
+        return await asyncio.shield(future)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._process(batch)
+
+    async def _process(self, batch):
+        loop = asyncio.get_running_loop()
+        self.batches += 1
+        self.batched_requests += len(batch)
+
+        # One model call per distinct set of generation settings
+        groups = {}
+        for item in batch:
+            groups.setdefault(item[2], []).append(item)
+        for (max_length, min_length, do_sample), items in groups.items():
+            texts = [text for _, text, _, _ in items]
+            try:
+                if do_sample:
+                    summaries = await loop.run_in_executor(self._executor, self._sample, texts, max_length,
+                                                           min_length)
+                else:
+                    summaries = await loop.run_in_executor(self._executor, self.summarizer.summarize_batch,
+                                                           texts, max_length, min_length, len(texts))
+            except Exception as error:
+                summaries = [error] * len(items)
+            for (key, _, _, future), summary in zip(items, summaries):
+                if key is not None:
+                    self._in_flight.pop(key, None)
+                if future.done():
+                    continue
+                if isinstance(summary, Exception):
+                    future.set_exception(summary)
+                else:
+                    future.set_result(summary)
+
+    def _sample(self, texts, max_length, min_length):
+        return [self.summarizer.summarize(text, max_length=max_length, min_length=min_length, do_sample=True)
+                for text in texts]
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "mean_batch_size": self.batched_requests / self.batches if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
+
+
+# Minimal HTTP/1.1 front end: POST /summarize, GET /health, /stats and /metrics, with keep-alive
+class SummarizationServer:
+    def __init__(self, summarizer, batcher):
+        self.summarizer = summarizer
+        self.batcher = batcher
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_BYTES:
+                    await self.respond(writer, 413, {"error": "request body too large"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload = await self.route(method, path, body)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method, path, body):
+        if path == "/health":
+            return 200, {"status": "ok", "model_ready": self.summarizer.model_ready}
+        if path == "/metrics":
+            return 200, self.summarizer.metrics.summary()
+        if path == "/stats":
+            stats = self.batcher.stats()
+            if self.summarizer.cache is not None:
+                stats["cache"] = self.summarizer.cache.stats()
+            return 200, stats
+        if path != "/summarize":
+            return 404, {"error": "not found"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+
+        try:
+            request = json.loads(body)
+            text = request["text"]
+            max_length = int(request.get("max_length", 50))
+            min_length = int(request.get("min_length", 25))
+            do_sample = bool(request.get("do_sample", False))
+        except (ValueError, KeyError, TypeError):
+            return 400, {"error": "expected a JSON object with a 'text' field"}
+        if not isinstance(text, str) or not text.strip():
+            return 400, {"error": "text cannot be empty"}
+
+        try:
+            summary = await self.batcher.summarize(text, max_length, min_length, do_sample)
+        except ServerBusy:
+            return 503, {"error": "server is busy, retry later"}
+        except Exception as error:
+            return 500, {"error": str(error)}
+        return 200, {"summary": summary}
+
+    @staticmethod
+    async def respond(writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode("utf-8")
+        head = [f"HTTP/1.1 {status} {STATUS_TEXT[status]}",
+                "Content-Type: application/json",
+                f"Content-Length: {len(body)}",
+                f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if status == 503:
+            head.append("Retry-After: 1")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+
+async def serve(args):
+    summarizer = Summarizer(**summarizer_options(args))
+    started = time.perf_counter()
+    await asyncio.get_running_loop().run_in_executor(None, summarizer.wait_until_ready)
+    print(f"Model loaded in {time.perf_counter() - started:.1f} s", file=sys.stderr)
+
+    batcher = MicroBatcher(summarizer, args.batch_window_ms, args.max_batch_size, args.max_queue)
+    server = SummarizationServer(summarizer, batcher)
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        listener = await asyncio.start_unix_server(server.handle_connection, path=args.socket)
+        print(f"Listening on unix socket {args.socket}", file=sys.stderr)
+    else:
+        listener = await asyncio.start_server(server.handle_connection, args.host, args.port)
+        print(f"Listening on http://{args.host}:{args.port}", file=sys.stderr)
+
+    batch_task = asyncio.create_task(batcher.run())
+    async with listener:
+        try:
+            await listener.serve_forever()
+        finally:
+            batch_task.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local summarization server sharing one loaded model")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--batch-window-ms", type=float, default=BATCH_WINDOW_MS,
+                        help="how long to wait for more requests before running a batch")
+    parser.add_argument("--max-batch-size", type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument("--max-queue", type=int, default=MAX_QUEUED_REQUESTS,
+                        help="queued requests beyond this are rejected with 503")
+    add_backend_arguments(parser)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
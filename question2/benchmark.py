@@ -0,0 +1,134 @@
+# Github link: https://github.com/19rafsan97/HIT137_Assignment_3/tree/main
+
+import argparse
+import json
+import os
+import random
+import sys
+
+# The scenes run without a window, so pick the dummy drivers before pygame starts
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+# The JSON report goes to stdout, so keep pygame's import banner out of it
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import numpy as np
+import pygame
+
+import game
+
+# Scene name: (enemies, projectiles) kept alive for the whole run
+SCENES = {
+    'light': (50, 20),
+    'medium': (500, 200),
+    'heavy': (2000, 1000),
+    'swarm': (5000, 2000),
+}
+
+# Enemies are spread over the chunks that stay resident around the starting view
+SPAWN_WIDTH = 2000
+# Scene enemies never die, so the level never completes and hit handling stays in every frame
+SCENE_ENEMY_HEALTH = 2 ** 30
+# Enough lives that the player outlasts the scene however often enemies touch it
+SCENE_PLAYER_LIVES = 2 ** 30
+
+
+# Scripted input: the player paces right and left so the camera and background keep moving, firing all the while
+def scripted_controls(frame):
+    return game.Controls(right=frame % 120 < 60, left=frame % 120 >= 60, jump=frame % 90 == 0,
+                         shoot=frame % 5 == 0)
+
+
+def run_scene(screen, enemy_count, projectile_count, frames, seed=0):
+    random.seed(seed)
+    profiler = game.FrameProfiler(history=frames)
+    world = game.GameWorld(game.SoundManager(), projectile_overflow='reuse_oldest',
+                           projectile_capacity=max(projectile_count + 1, game.PROJECTILE_POOL_SIZE), profiler=profiler)
+    entities = [{'type': 'enemy', 'x': random.randrange(SPAWN_WIDTH), 'y': 400} for _ in range(enemy_count)]
+    world.use_level(game.LevelStreamer(game.LevelData({'entities': entities}), world.sound_manager))
+    world.enemies.health[:world.enemies.count] = SCENE_ENEMY_HEALTH
+    world.player.lives = SCENE_PLAYER_LIVES
+
+    renderer = game.Renderer(screen, profiler)
+    hud = game.HUD()
+    for frame in range(frames):
+        profiler.begin_frame()
+        # Top the projectiles back up to the scene size, fired from across the view in both directions
+        view = world.view_rect()
+        while world.projectiles.count < projectile_count:
+            world.projectiles.fire(random.randrange(view.left, view.right), random.randrange(300, 700),
+                                   random.choice((-1, 1)))
+        world.step(scripted_controls(frame))
+        hud.update(world.score, world.player)
+        renderer.draw(world, hud, 1.0)
+        profiler.end_frame()
+    world.level.close()
+    return profiler.summary()
+
+
+# Compares mean and p99 frame times with an earlier run and returns the scenes that got slower than the tolerance
+def find_regressions(results, baseline, tolerance):
+    previous = {row['scene']: row for row in baseline['results']}
+    regressions = []
+    for row in results:
+        before = previous.get(row['scene'])
+        if before is None:
+            continue
+        for measure in ('mean', 'p99'):
+            if row['frame_ms'][measure] > before['frame_ms'][measure] * (1 + tolerance):
+                regressions.append((row, before, measure))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scripted stress scenes for the game, run on the SDL dummy driver")
+    parser.add_argument('--scenes', default=','.join(SCENES), help=f"comma-separated scenes ({', '.join(SCENES)})")
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--output', help="write results to this JSON file")
+    parser.add_argument('--baseline', help="earlier --output file to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help="allowed mean or p99 frame time increase against the baseline (default 10%%)")
+    args = parser.parse_args(argv)
+
+    scenes = [name.strip() for name in args.scenes.split(',')]
+    for name in scenes:
+        if name not in SCENES:
+            parser.error(f"unknown scene {name!r}")
+
+    # Assets load relative to the game directory
+    os.chdir(os.path.dirname(os.path.abspath(game.__file__)))
+    screen = pygame.display.set_mode((game.SCREEN_WIDTH, game.SCREEN_HEIGHT))
+    game.assets.preload()
+
+    results = []
+    for name in scenes:
+        enemy_count, projectile_count = SCENES[name]
+        summary = run_scene(screen, enemy_count, projectile_count, args.frames)
+        results.append({'scene': name, 'enemies': enemy_count, 'projectiles': projectile_count, **summary})
+        frame_ms = summary['frame_ms']
+        print(f"{name:<7} {enemy_count:>5} enemies {projectile_count:>5} projectiles  "
+              f"mean {frame_ms['mean']:.2f} ms  p99 {frame_ms['p99']:.2f} ms  max {frame_ms['max']:.2f} ms",
+              file=sys.stderr)
+
+    report = {
+        'environment': {'pygame': pygame.version.ver, 'numpy': np.__version__, 'frames': args.frames},
+        'results': results,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            regressions = find_regressions(results, json.load(file), args.tolerance)
+        for row, before, measure in regressions:
+            print(f"Regression: {row['scene']} {measure} {before['frame_ms'][measure]:.2f} ms -> "
+                  f"{row['frame_ms'][measure]:.2f} ms", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
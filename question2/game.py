@@ -1,7 +1,20 @@
 # Github link: https://github.com/19rafsan97/HIT137_Assignment_3/tree/main
 
-import pygame
+import argparse
+import csv
+import json
+import math
+import os
+import struct
 import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+import pygame
 
 # Initialize Pygame
 pygame.init()
@@ -13,10 +26,145 @@ SCREEN_HEIGHT = 800
 # Frame rate
 FPS = 60
 
+# The simulation always advances in ticks of this length, whatever the frame rate
+TIME_STEP = 1 / FPS
+# Real time counted per frame is capped, so a long stall does not set off a burst of catch-up ticks
+MAX_FRAME_TIME = 0.25
+
+# Rendered text surfaces kept for reuse
+TEXT_CACHE_ENTRIES = 128
+
+# Side of one collision grid cell, roughly the size of the largest sprite
+COLLISION_CELL_SIZE = 400
+
+# Projectiles this far outside the camera view are dropped
+PROJECTILE_MARGIN = 50
+PROJECTILE_SPEED = 10
+# Most projectiles alive at once. When the pool is full a new shot is either dropped ('drop') or takes
+# over the oldest live projectile ('reuse_oldest').
+PROJECTILE_POOL_SIZE = 256
+PROJECTILE_OVERFLOW = 'drop'
+
+# Sprites this far outside the camera view are still drawn, to cover interpolation between ticks
+CULL_MARGIN = 64
+# Beyond this many changed regions a frame is pushed to the display in one piece
+MAX_DIRTY_RECTS = 48
+
+# Levels are stored under this directory as levelN.json, or levelN.lvl once compiled
+LEVEL_DIRECTORY = 'levels'
+# Width of one level chunk along the x axis
+CHUNK_WIDTH = 1024
+# Chunks kept active on each side of the camera view
+STREAM_MARGIN_CHUNKS = 1
+
+# Packed level layout: header, then one index entry per chunk, then the entity records sorted by chunk
+LEVEL_MAGIC = b'SSLV'
+LEVEL_HEADER = struct.Struct('<4sIII')  # magic, chunk width, chunk count, enemy count
+CHUNK_INDEX_ENTRY = struct.Struct('<II')  # first record, record count
+ENTITY_RECORD = struct.Struct('<Bii')  # entity type code, x, y
+ENTITY_TYPES = ('enemy', 'boss', 'health', 'extra_life')
+ENEMY_TYPES = ('enemy', 'boss')
+
+# Frame profiler: subsystems timed each frame and how many recent frames are kept
+PROFILE_SECTIONS = ('player', 'enemies', 'projectiles', 'collisions', 'streaming', 'parallax', 'render', 'display')
+PROFILE_HISTORY = 600
+# The on-screen overlay is rebuilt every this many frames
+OVERLAY_REFRESH_FRAMES = 10
+OVERLAY_SIZE = (440, 210)
+FRAME_BUDGET_MS = 1000 / FPS
+# How long the level banner shows between levels
+LEVEL_TRANSITION_SECONDS = 1.5
+
+# Where F4 writes the kept frame timings
+PROFILE_EXPORT_PATH = 'frame_profile.csv'
+
+# Parallax background, back to front: image and scroll speed relative to the player. Speed 0 never moves.
+# background_layer1.png to background_layer3.png ship with the game but are fully opaque, so they would
+# hide this layer completely; a layer with transparent pixels can be added in front of it.
+PARALLAX_LAYERS = [
+    ('background_layer4.png', 0.2),
+]
+
 # Colors
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
 
+# Images every level uses, loaded once up front
+PRELOADED_IMAGES = ['bullet_image.png', 'enemy_image.png', 'boss_image.png', 'health_image.png',
+                    'extra_life_image.png']
+
+# Asset Manager Class
+# Loads each image once, converts it to the display pixel format and hands out the shared surface.
+# Sprites must not draw on these surfaces, since every instance shares them.
+class AssetManager:
+    def __init__(self):
+        self.images = {}
+        self.frame_sets = {}
+        self.fonts = {}
+
+    def image(self, filename, alpha=True):
+        key = (filename, alpha)
+        if key not in self.images:
+            surface = pygame.image.load(filename)
+            self.images[key] = surface.convert_alpha() if alpha else surface.convert()
+        return self.images[key]
+
+    # Returns the frames of a sprite sheet together with their horizontally flipped copies
+    def frames(self, filename, rows, columns):
+        key = (filename, rows, columns)
+        if key not in self.frame_sets:
+            sprite_sheet = self.image(filename)
+            frame_width = sprite_sheet.get_width() // columns
+            frame_height = sprite_sheet.get_height() // rows
+            frames = []
+            for row in range(rows):
+                for col in range(columns):
+                    frame = sprite_sheet.subsurface(pygame.Rect(
+                        col * frame_width,
+                        row * frame_height,
+                        frame_width,
+                        frame_height))
+                    frames.append(frame)
+            flipped_frames = [pygame.transform.flip(frame, True, False) for frame in frames]
+            self.frame_sets[key] = (frames, flipped_frames)
+        return self.frame_sets[key]
+
+    # Default font at the given size, built once
+    def font(self, size):
+        if size not in self.fonts:
+            self.fonts[size] = pygame.font.Font(None, size)
+        return self.fonts[size]
+
+    # Needs the display mode to be set, because conversion targets the display format
+    def preload(self):
+        for filename in PRELOADED_IMAGES:
+            self.image(filename)
+        self.frames('player_spritesheet.png', 1, 4)
+
+# Shared by all sprites
+assets = AssetManager()
+
+# Text Cache Class
+# Renders text once per (text, size, color) and keeps the most recently used surfaces
+class TextCache:
+    def __init__(self, max_entries=TEXT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+
+    def render(self, text, size, color=WHITE):
+        key = (text, size, color)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = assets.font(size).render(text, True, color)
+            self.surfaces[key] = surface
+            if len(self.surfaces) > self.max_entries:
+                self.surfaces.popitem(last=False)
+        else:
+            self.surfaces.move_to_end(key)
+        return surface
+
+text_cache = TextCache()
+
 # Sound Manager Class
 class SoundManager:
     def __init__(self):
@@ -34,15 +182,37 @@ class SoundManager:
     def play_collect(self):
         self.collect_sound.play()
 
+# Controls Class
+# One tick of player input, read from the keyboard or supplied by a script when running headless
+class Controls:
+    def __init__(self, left=False, right=False, jump=False, shoot=False):
+        self.left = left
+        self.right = right
+        self.jump = jump
+        self.shoot = shoot
+
+    @classmethod
+    def from_keyboard(cls, shoot=False):
+        keys = pygame.key.get_pressed()
+        return cls(keys[pygame.K_LEFT], keys[pygame.K_RIGHT], keys[pygame.K_SPACE], shoot)
+
 # Player Class
 class Player(pygame.sprite.Sprite):
     def __init__(self, sound_manager):
         super().__init__()
         self.sound_manager = sound_manager
-        # Load sprite sheet and extract frames for animation
-        self.sprite_sheet = pygame.image.load('player_spritesheet.png').convert_alpha()
-        self.frames = self.extract_frames(self.sprite_sheet, 1, 4)  # Adjust rows and columns as needed
+        # Animation frames and their mirrored copies come from the shared asset cache
+        self.frames, self.flipped_frames = assets.frames('player_spritesheet.png', 1, 4)  # Adjust rows and columns as needed
 
+        self.acceleration = 0.5
+        self.deceleration = 0.9
+        self.max_speed = 7
+        self.gravity = 1
+        self.jump_power = -15
+        self.reset()
+
+    # Back to the starting position with full health and lives, for a new game
+    def reset(self):
         self.image = self.frames[0]
         self.rect = self.image.get_rect()
         self.rect.x = 100
@@ -50,11 +220,6 @@ class Player(pygame.sprite.Sprite):
 
         self.velocity_x = 0
         self.velocity_y = 0
-        self.acceleration = 0.5
-        self.deceleration = 0.9
-        self.max_speed = 7
-        self.gravity = 1
-        self.jump_power = -15
         self.is_jumping = False
         self.is_running = False
         self.current_frame = 0
@@ -63,29 +228,14 @@ class Player(pygame.sprite.Sprite):
         self.lives = 3
         self.facing_right = True
 
-    def extract_frames(self, sprite_sheet, rows, columns):
-        frame_width = sprite_sheet.get_width() // columns
-        frame_height = sprite_sheet.get_height() // rows
-        frames = []
-        for row in range(rows):
-            for col in range(columns):
-                frame = sprite_sheet.subsurface(pygame.Rect(
-                    col * frame_width,
-                    row * frame_height,
-                    frame_width,
-                    frame_height))
-                frames.append(frame)
-        return frames
-
-    def update(self):
-        keys = pygame.key.get_pressed()
-
+    # Advances the player by one simulation tick
+    def update(self, controls):
         # Horizontal movement
-        if keys[pygame.K_RIGHT]:
+        if controls.right:
             self.velocity_x += self.acceleration
             self.is_running = True
             self.facing_right = True
-        elif keys[pygame.K_LEFT]:
+        elif controls.left:
             self.velocity_x -= self.acceleration
             self.is_running = True
             self.facing_right = False
@@ -97,7 +247,7 @@ class Player(pygame.sprite.Sprite):
         self.velocity_x = max(-self.max_speed, min(self.max_speed, self.velocity_x))
 
         # Jumping
-        if not self.is_jumping and keys[pygame.K_SPACE]:
+        if not self.is_jumping and controls.jump:
             self.is_jumping = True
             self.velocity_y = self.jump_power
             self.sound_manager.play_jump()
@@ -127,78 +277,248 @@ class Player(pygame.sprite.Sprite):
         else:
             self.current_frame = 0
 
-        self.image = self.frames[self.current_frame]
-        if not self.facing_right:
-            self.image = pygame.transform.flip(self.image, True, False)
+        if self.facing_right:
+            self.image = self.frames[self.current_frame]
+        else:
+            self.image = self.flipped_frames[self.current_frame]
 
-    def shoot(self):
-        self.sound_manager.play_shoot()
+    def shoot(self, projectiles):
         if self.facing_right:
             direction = 1
         else:
             direction = -1
-        return Projectile(self.rect.centerx, self.rect.centery, direction)
-
-# Projectile Class
-class Projectile(pygame.sprite.Sprite):
-    def __init__(self, x, y, direction):
+        projectile = projectiles.fire(self.rect.centerx, self.rect.centery, direction)
+        if projectile is not None:
+            self.sound_manager.play_shoot()
+        return projectile
+
+# Entity Store Class
+# Structure-of-arrays storage: one NumPy array per attribute, indexed by slot, so a whole population is
+# updated with a handful of array operations. Live entities fill slots 0 to count - 1; removing one moves
+# the last entity into its slot.
+class EntityStore:
+    fields = ()
+
+    def __init__(self, capacity=64):
+        self.count = 0
+        self.sprites = []
+        for name in self.fields:
+            setattr(self, name, np.zeros(capacity, dtype=np.int32))
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(list(self.sprites))
+
+    def add(self, sprite, **values):
+        if self.count == len(getattr(self, self.fields[0])):
+            for name in self.fields:
+                setattr(self, name, np.resize(getattr(self, name), 2 * self.count))
+        slot = self.count
+        for name in self.fields:
+            getattr(self, name)[slot] = values.get(name, 0)
+        self.sprites.append(sprite)
+        self.count += 1
+        return slot
+
+    def remove(self, slot):
+        last = self.count - 1
+        removed = self.sprites[slot]
+        if slot != last:
+            for name in self.fields:
+                array = getattr(self, name)
+                array[slot] = array[last]
+            moved = self.sprites[last]
+            self.sprites[slot] = moved
+            moved.slot = slot
+        self.sprites.pop()
+        self.count = last
+        removed.slot = None
+
+    # Highest slot first, so the entities moved into freed slots are never ones still waiting to be removed
+    def remove_many(self, slots):
+        for slot in sorted(slots, reverse=True):
+            self.remove(int(slot))
+
+    def rect(self, slot):
+        return pygame.Rect(int(self.x[slot]), int(self.y[slot]), int(self.w[slot]), int(self.h[slot]))
+
+    # Slots of the entities overlapping a rect, with the same edge rules as Rect.colliderect
+    def overlapping(self, rect):
+        n = self.count
+        x, y = self.x[:n], self.y[:n]
+        return np.flatnonzero((x < rect.right) & (x + self.w[:n] > rect.left) &
+                              (y < rect.bottom) & (y + self.h[:n] > rect.top))
+
+    # Visible slots and their positions blended between the last two ticks
+    def draw_positions(self, rect, alpha):
+        slots = self.overlapping(rect)
+        previous_x = self.previous_x[slots]
+        x = previous_x + (self.x[slots] - previous_x) * alpha
+        return slots, x, self.y[slots]
+
+# Enemy Store Class
+class EnemyStore(EntityStore):
+    fields = ('x', 'y', 'w', 'h', 'previous_x', 'speed_x', 'health', 'patrol_left', 'patrol_right', 'chase_range')
+
+    # Chase or patrol for every enemy at once
+    def update(self, player):
+        n = self.count
+        x, speed_x = self.x[:n], self.speed_x[:n]
+        self.previous_x[:n] = x
+        player_x = player.rect.x
+
+        # Enemies within range chase the player, the rest patrol and turn at the ends of their range
+        chasing = np.abs(player_x - x) < self.chase_range[:n]
+        chase_step = np.where(player_x > x, speed_x, -speed_x)
+        x += np.where(chasing, chase_step, speed_x)
+        turning = ~chasing & ((x < self.patrol_left[:n]) | (x > self.patrol_right[:n]))
+        speed_x[turning] = -speed_x[turning]
+
+    # Removes the enemies whose health runs out
+    def damage(self, slots, amount):
+        np.subtract.at(self.health, slots, amount)
+        self.remove_many(np.flatnonzero(self.health[:self.count] <= 0))
+
+# Projectile Store Class
+# A fixed-capacity pool: the views and arrays are allocated up front and recycled, so firing allocates nothing
+class ProjectileStore(EntityStore):
+    fields = ('x', 'y', 'w', 'h', 'previous_x', 'speed_x', 'serial')
+
+    def __init__(self, capacity=PROJECTILE_POOL_SIZE, overflow=PROJECTILE_OVERFLOW):
+        if overflow not in ('drop', 'reuse_oldest'):
+            raise ValueError(f"unknown projectile overflow policy {overflow!r}")
+        super().__init__(capacity)
+        self.capacity = capacity
+        self.overflow = overflow
+        self.free = [Projectile(self) for _ in range(capacity)]
+        self.fired = 0
+        self.dropped = 0
+        self.recycled = 0
+
+    # Returns the projectile, or None when the pool is full and the policy is to drop the shot
+    def fire(self, x, y, direction, speed=PROJECTILE_SPEED):
+        if self.count == self.capacity:
+            if self.overflow == 'drop':
+                self.dropped += 1
+                return None
+            self.remove(int(np.argmin(self.serial[:self.count])))
+            self.recycled += 1
+
+        projectile = self.free.pop()
+        width, height = projectile.image.get_size()
+        slot = self.count
+        # Same placement as rect.center = (x, y)
+        self.x[slot] = self.previous_x[slot] = x - width // 2
+        self.y[slot] = y - height // 2
+        self.w[slot] = width
+        self.h[slot] = height
+        self.speed_x[slot] = speed * direction
+        self.serial[slot] = self.fired
+        self.fired += 1
+        self.sprites.append(projectile)
+        self.count += 1
+        projectile.slot = slot
+        return projectile
+
+    def remove(self, slot):
+        projectile = self.sprites[slot]
+        super().remove(slot)
+        self.free.append(projectile)
+
+    # Returns every live projectile to the pool
+    def clear(self):
+        self.remove_many(range(self.count))
+
+    # Moves every projectile and drops the ones that left the camera view
+    def update(self, view_rect):
+        n = self.count
+        x = self.x[:n]
+        self.previous_x[:n] = x
+        x += self.speed_x[:n]
+        self.remove_many(np.flatnonzero((x > view_rect.right + PROJECTILE_MARGIN) |
+                                        (x + self.w[:n] < view_rect.left - PROJECTILE_MARGIN)))
+
+# Pairs of (projectile slot, enemy slot) that overlap. Enemies are sorted by x, so each projectile is only
+# tested against the enemies whose left edge is within one enemy width of it.
+def projectile_hits(projectiles, enemies):
+    if not projectiles.count or not enemies.count:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    order = np.argsort(enemies.x[:enemies.count], kind='stable')
+    lefts = enemies.x[order]
+    widest = int(enemies.w[:enemies.count].max())
+    shot_left = projectiles.x[:projectiles.count]
+    shot_right = shot_left + projectiles.w[:projectiles.count]
+
+    low = np.searchsorted(lefts, shot_left - widest, side='right')
+    high = np.searchsorted(lefts, shot_right, side='left')
+    counts = high - low
+    shot_slots = np.repeat(np.arange(projectiles.count), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    enemy_slots = order[np.repeat(low, counts) + offsets]
+
+    # Exact box test on the candidates
+    hit = ((projectiles.x[shot_slots] < enemies.x[enemy_slots] + enemies.w[enemy_slots]) &
+           (projectiles.x[shot_slots] + projectiles.w[shot_slots] > enemies.x[enemy_slots]) &
+           (projectiles.y[shot_slots] < enemies.y[enemy_slots] + enemies.h[enemy_slots]) &
+           (projectiles.y[shot_slots] + projectiles.h[shot_slots] > enemies.y[enemy_slots]))
+    return shot_slots[hit], enemy_slots[hit]
+
+# Entity View Class
+# A sprite that only points at a slot in a store. The store holds the state; the view supplies the image
+# for drawing and stays valid until its entity is removed.
+class EntityView(pygame.sprite.Sprite):
+    def __init__(self, store, image):
         super().__init__()
-        self.image = pygame.image.load('bullet_image.png').convert_alpha()
-        self.rect = self.image.get_rect(center=(x, y))
-        self.speed_x = 10 * direction
+        self.store = store
+        self.image = image
+        self.slot = None
 
-    def update(self):
-        self.rect.x += self.speed_x
-        if self.rect.x > SCREEN_WIDTH + 50 or self.rect.x < -50:
-            self.kill()
+    @property
+    def rect(self):
+        return self.store.rect(self.slot)
+
+    def alive(self):
+        return self.slot is not None
+
+    def kill(self):
+        if self.slot is not None:
+            self.store.remove(self.slot)
+
+# Projectile Class
+# Created only when the pool is built; ProjectileStore.fire places it in the world
+class Projectile(EntityView):
+    def __init__(self, store):
+        super().__init__(store, assets.image('bullet_image.png'))
 
 # Enemy Class
-class Enemy(pygame.sprite.Sprite):
-    def __init__(self, x, y):
-        super().__init__()
-        self.image = pygame.image.load('enemy_image.png').convert_alpha()
-        self.rect = self.image.get_rect()
-        self.rect.x = x
-        self.rect.y = y
-        self.speed_x = 2
-        self.chase_range = 300
-        self.patrol_range = (x - 100, x + 100)
-        self.health = 50
+class Enemy(EntityView):
+    image_name = 'enemy_image.png'
+    max_health = 50
+    speed = 2
 
-    def update(self, player):
-        # Check distance to player
-        distance_to_player = abs(player.rect.x - self.rect.x)
-
-        if distance_to_player < self.chase_range:
-            # Chase player
-            if player.rect.x > self.rect.x:
-                self.rect.x += self.speed_x
-            else:
-                self.rect.x -= self.speed_x
-        else:
-            # Patrol
-            self.rect.x += self.speed_x
-            if self.rect.x < self.patrol_range[0] or self.rect.x > self.patrol_range[1]:
-                self.speed_x = -self.speed_x
+    def __init__(self, store, x, y):
+        super().__init__(store, assets.image(self.image_name))
+        width, height = self.image.get_size()
+        self.slot = store.add(self, x=x, y=y, w=width, h=height, previous_x=x, speed_x=self.speed,
+                              health=self.max_health, patrol_left=x - 100, patrol_right=x + 100, chase_range=300)
 
-    def take_damage(self, amount):
-        self.health -= amount
-        if self.health <= 0:
-            self.kill()
+    @property
+    def health(self):
+        return int(self.store.health[self.slot])
 
 # BossEnemy Class
 class BossEnemy(Enemy):
-    def __init__(self, x, y):
-        super().__init__(x, y)
-        self.image = pygame.image.load('boss_image.png').convert_alpha()
-        self.health = 200
-        self.speed_x = 1
+    image_name = 'boss_image.png'
+    max_health = 200
+    speed = 1
 
 # Collectible Class
 class Collectible(pygame.sprite.Sprite):
     def __init__(self, x, y, collectible_type, sound_manager):
         super().__init__()
-        self.image = pygame.image.load(f'{collectible_type}_image.png').convert_alpha()
+        self.image = assets.image(f'{collectible_type}_image.png')
         self.rect = self.image.get_rect()
         self.rect.center = (x, y)
         self.collectible_type = collectible_type
@@ -212,33 +532,92 @@ class Collectible(pygame.sprite.Sprite):
         self.sound_manager.play_collect()
         self.kill()
 
+# ParallaxLayer Class
+# One background image scaled to the screen height and tiled into a strip wide enough that any scroll
+# position is a single blit. The position wraps by the layer's own width.
+class ParallaxLayer:
+    def __init__(self, filename, speed):
+        self.speed = speed
+        tile = load_background(filename)
+        self.opaque = not tile.get_flags() & pygame.SRCALPHA
+        if tile.get_height() != SCREEN_HEIGHT:
+            width = max(1, round(tile.get_width() * SCREEN_HEIGHT / tile.get_height()))
+            tile = pygame.transform.smoothscale(tile, (width, SCREEN_HEIGHT))
+        self.width = tile.get_width()
+        # Whole tiles covering the screen plus one more, so the view never runs off the end.
+        # BLEND_RGBA_MAX onto the empty strip copies the pixels, alpha included, instead of blending them.
+        self.strip = pygame.Surface((self.width * (SCREEN_WIDTH // self.width + 2), SCREEN_HEIGHT),
+                                    tile.get_flags(), tile)
+        for x in range(0, self.strip.get_width(), self.width):
+            self.strip.blit(tile, (x, 0), special_flags=pygame.BLEND_RGBA_MAX)
+        self.area = pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
+        self.position = 0.0
+
+    def update(self, player_velocity_x):
+        self.position = (self.position + player_velocity_x * self.speed) % self.width
+
+    def state(self):
+        return round(self.position) % self.width
+
+    def draw(self, screen):
+        self.area.x = self.state()
+        screen.blit(self.strip, (0, 0), self.area)
+
+# Loads a background image in the display format, keeping per-pixel alpha only if some pixel is see-through
+def load_background(filename):
+    image = pygame.image.load(filename)
+    if image.get_flags() & pygame.SRCALPHA and pygame.surfarray.pixels_alpha(image).min() < 255:
+        return image.convert_alpha()
+    return image.convert()
+
 # ParallaxBackground Class
 class ParallaxBackground:
-    def __init__(self):
-        self.background_layers = [
-            pygame.image.load('background_layer4.png').convert()
-            
-        ]
-        self.bg_positions = [0, 0, 0]
-        self.layer_speeds = [0.2, 0.4, 0.6]
+    def __init__(self, layers=PARALLAX_LAYERS):
+        layers = [ParallaxLayer(*layer) for layer in layers]
+        # An opaque layer hides everything behind it, so those layers are never drawn
+        opaque = [i for i, layer in enumerate(layers) if layer.opaque]
+        if opaque:
+            layers = layers[opaque[-1]:]
+        # Layers at the back that never move are flattened into one cached backdrop, black wherever they
+        # leave gaps. An opaque moving layer at the back needs no backdrop at all.
+        static = 0
+        while static < len(layers) and not layers[static].speed:
+            static += 1
+        self.backdrop = None
+        if static or not layers or not layers[0].opaque:
+            self.backdrop = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)).convert()
+            self.backdrop.fill(BLACK)
+            for layer in layers[:static]:
+                layer.draw(self.backdrop)
+        self.layers = layers[static:]
+
+    def reset(self):
+        for layer in self.layers:
+            layer.position = 0.0
 
     def update(self, player_velocity_x):
-        for i in range(len(self.bg_positions)):
-            self.bg_positions[i] -= player_velocity_x * self.layer_speeds[i]
-            # Loop the background images
-            if self.bg_positions[i] <= -SCREEN_WIDTH:
-                self.bg_positions[i] = 0
+        for layer in self.layers:
+            layer.update(player_velocity_x)
+
+    # Whole-pixel layer positions; the picture only changes when these do
+    def state(self):
+        return tuple(layer.state() for layer in self.layers)
 
+    # Covers the whole screen, so nothing needs clearing first
     def draw(self, screen):
-        for i, bg in enumerate(self.background_layers):
-            screen.blit(bg, (self.bg_positions[i], 0))
-            screen.blit(bg, (self.bg_positions[i] + SCREEN_WIDTH, 0))
+        if self.backdrop is not None:
+            screen.blit(self.backdrop, (0, 0))
+        for layer in self.layers:
+            layer.draw(screen)
 
 # Camera Class
 class Camera:
     def __init__(self, width, height):
         self.camera_rect = pygame.Rect(0, 0, width, height)
 
+    def reset(self):
+        self.camera_rect.topleft = (0, 0)
+
     def apply(self, entity):
         return entity.rect.move(self.camera_rect.topleft)
 
@@ -254,204 +633,873 @@ class Camera:
         self.camera_rect.x += (x - self.camera_rect.x) * 0.1
         self.camera_rect.y += (y - self.camera_rect.y) * 0.1
 
+# Spatial Hash Group Class
+# A sprite group that also files its sprites into a uniform grid, so a collision check only looks at
+# sprites in the cells it overlaps instead of the whole group
+class SpatialHashGroup(pygame.sprite.Group):
+    def __init__(self, *sprites, cell_size=COLLISION_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.sprite_cells = {}
+        super().__init__(*sprites)
+
+    def cell_bounds(self, rect):
+        size = self.cell_size
+        return (rect.left // size, rect.top // size, (rect.right - 1) // size, (rect.bottom - 1) // size)
+
+    def insert(self, sprite, bounds):
+        self.sprite_cells[sprite] = bounds
+        left, top, right, bottom = bounds
+        for cell_x in range(left, right + 1):
+            for cell_y in range(top, bottom + 1):
+                # Dicts keep insertion order, so collision results come out in a repeatable order
+                self.cells.setdefault((cell_x, cell_y), {})[sprite] = None
+
+    def remove_from_cells(self, sprite):
+        left, top, right, bottom = self.sprite_cells.pop(sprite)
+        for cell_x in range(left, right + 1):
+            for cell_y in range(top, bottom + 1):
+                cell = self.cells[(cell_x, cell_y)]
+                del cell[sprite]
+                if not cell:
+                    del self.cells[(cell_x, cell_y)]
+
+    # Group membership keeps the grid in step, so kill() also takes a sprite out of the grid
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        self.insert(sprite, self.cell_bounds(sprite.rect))
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.remove_from_cells(sprite)
+
+    # Re-files only the sprites that moved into different cells
+    def rehash(self):
+        for sprite in self.sprites():
+            bounds = self.cell_bounds(sprite.rect)
+            if bounds != self.sprite_cells[sprite]:
+                self.remove_from_cells(sprite)
+                self.insert(sprite, bounds)
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.rehash()
+
+    # Sprites overlapping a rect, such as another sprite or the camera view
+    def query(self, rect):
+        left, top, right, bottom = self.cell_bounds(rect)
+        candidates = {}
+        for cell_x in range(left, right + 1):
+            for cell_y in range(top, bottom + 1):
+                cell = self.cells.get((cell_x, cell_y))
+                if cell:
+                    candidates.update(cell)
+        return [other for other in candidates if rect.colliderect(other.rect)]
+
+    # Same result as pygame.sprite.spritecollide(sprite, group, False)
+    def collide(self, sprite):
+        return self.query(sprite.rect)
+
+# Groups level entities into chunks by x position
+def chunk_entities(entities, chunk_width):
+    chunks = []
+    for entity in entities:
+        entity_type, x, y = entity['type'], int(entity['x']), int(entity['y'])
+        if entity_type not in ENTITY_TYPES:
+            raise ValueError(f"unknown entity type {entity_type!r}")
+        if x < 0:
+            raise ValueError(f"entity x position must not be negative, got {x}")
+        index = x // chunk_width
+        while len(chunks) <= index:
+            chunks.append([])
+        chunks[index].append((entity_type, x, y))
+    return chunks
+
+# Level Data Class
+# A level authored as JSON: {"chunk_width": 1024, "entities": [{"type": "enemy", "x": 800, "y": 400}, ...]}
+class LevelData:
+    def __init__(self, spec):
+        self.chunk_width = int(spec.get('chunk_width', CHUNK_WIDTH))
+        self.chunks = chunk_entities(spec.get('entities', []), self.chunk_width)
+        self.chunk_count = len(self.chunks)
+        self.enemy_count = sum(1 for chunk in self.chunks for entity in chunk if entity[0] in ENEMY_TYPES)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as file:
+            return cls(json.load(file))
+
+    def read_chunk(self, index):
+        return list(self.chunks[index])
+
+    def close(self):
+        pass
+
+# Packed Level Data Class
+# A compiled level. Only the header and chunk index are read up front; chunks are read from disk as they are needed.
+class PackedLevelData:
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        # The prefetch thread and the game loop share the file position
+        self.lock = threading.Lock()
+        magic, self.chunk_width, self.chunk_count, self.enemy_count = LEVEL_HEADER.unpack(
+            self.file.read(LEVEL_HEADER.size))
+        if magic != LEVEL_MAGIC:
+            self.file.close()
+            raise ValueError(f"{path} is not a packed level file")
+        self.index = self.file.read(CHUNK_INDEX_ENTRY.size * self.chunk_count)
+        self.records_start = LEVEL_HEADER.size + len(self.index)
+
+    def read_chunk(self, index):
+        first, count = CHUNK_INDEX_ENTRY.unpack_from(self.index, index * CHUNK_INDEX_ENTRY.size)
+        with self.lock:
+            self.file.seek(self.records_start + first * ENTITY_RECORD.size)
+            data = self.file.read(count * ENTITY_RECORD.size)
+        return [(ENTITY_TYPES[code], x, y) for code, x, y in ENTITY_RECORD.iter_unpack(data)]
+
+    def close(self):
+        self.file.close()
+
+# Converts a JSON level into the packed form the game ships with
+def compile_level(json_path, output_path):
+    level = LevelData.load(json_path)
+    with open(output_path, 'wb') as file:
+        file.write(LEVEL_HEADER.pack(LEVEL_MAGIC, level.chunk_width, level.chunk_count, level.enemy_count))
+        first = 0
+        for chunk in level.chunks:
+            file.write(CHUNK_INDEX_ENTRY.pack(first, len(chunk)))
+            first += len(chunk)
+        for chunk in level.chunks:
+            for entity_type, x, y in chunk:
+                file.write(ENTITY_RECORD.pack(ENTITY_TYPES.index(entity_type), x, y))
+    return level
+
+# Uses the compiled level when it is at least as new as its JSON source
+def level_path(level_number):
+    source = os.path.join(LEVEL_DIRECTORY, f'level{level_number}.json')
+    packed = os.path.join(LEVEL_DIRECTORY, f'level{level_number}.lvl')
+    if os.path.exists(packed) and (not os.path.exists(source) or os.path.getmtime(packed) >= os.path.getmtime(source)):
+        return packed
+    return source
+
+def level_count():
+    count = 0
+    while os.path.exists(level_path(count + 1)):
+        count += 1
+    return count
+
+def open_level(path):
+    if path.endswith('.lvl'):
+        return PackedLevelData(path)
+    return LevelData.load(path)
+
+# Level Streamer Class
+# Keeps only the chunks around the camera view alive as sprites. A retired chunk is rebuilt from the level
+# file when the camera comes back; only the entities defeated or picked up are remembered, so memory stays
+# flat however long the level is.
+class LevelStreamer:
+    def __init__(self, level, sound_manager, margin_chunks=STREAM_MARGIN_CHUNKS):
+        self.level = level
+        self.sound_manager = sound_manager
+        self.margin_chunks = margin_chunks
+        self.enemies = EnemyStore()
+        self.collectibles = SpatialHashGroup()
+        self.remaining_enemies = level.enemy_count
+        self.resident = {}
+        self.resident_count = 0
+        self.removed = {}
+        self.prefetched = {}
+        self.executor = None
+        self.last_view_left = None
+
+    def spawn(self, entity_type, x, y):
+        if entity_type in ENEMY_TYPES:
+            sprite = BossEnemy(self.enemies, x, y) if entity_type == 'boss' else Enemy(self.enemies, x, y)
+        else:
+            sprite = Collectible(x, y, entity_type, self.sound_manager)
+            self.collectibles.add(sprite)
+        return sprite
+
+    def activate(self, index):
+        future = self.prefetched.pop(index, None)
+        entities = future.result() if future is not None else self.level.read_chunk(index)
+        removed = self.removed.get(index, ())
+        sprites = []
+        for ordinal, entity in enumerate(entities):
+            if ordinal not in removed:
+                sprite = self.spawn(*entity)
+                sprite.chunk_ordinal = ordinal
+                sprites.append(sprite)
+        self.resident[index] = sprites
+        self.resident_count += len(sprites)
+
+    # Enemies that survive a retired chunk come back at their starting post with full health
+    def retire(self, index):
+        sprites = self.resident.pop(index)
+        for sprite in sprites:
+            sprite.kill()
+        self.resident_count -= len(sprites)
+
+    def prefetch(self, index):
+        if not 0 <= index < self.level.chunk_count or index in self.resident or index in self.prefetched:
+            return
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1)
+        self.prefetched[index] = self.executor.submit(self.level.read_chunk, index)
+
+    # Records the sprites killed or collected since the last tick
+    def forget_removed(self):
+        for index, sprites in self.resident.items():
+            alive = []
+            for sprite in sprites:
+                if sprite.alive():
+                    alive.append(sprite)
+                    continue
+                self.removed.setdefault(index, set()).add(sprite.chunk_ordinal)
+                if isinstance(sprite, Enemy):
+                    self.remaining_enemies -= 1
+            self.resident[index] = alive
+        self.resident_count = len(self.enemies) + len(self.collectibles)
+
+    # Called once per tick with the camera view in world coordinates
+    def update(self, view_rect):
+        # Resident sprites only leave their groups by being killed or collected
+        if len(self.enemies) + len(self.collectibles) != self.resident_count:
+            self.forget_removed()
+
+        chunk_width = self.level.chunk_width
+        first = max(0, view_rect.left // chunk_width - self.margin_chunks)
+        last = min(self.level.chunk_count - 1, (view_rect.right - 1) // chunk_width + self.margin_chunks)
+
+        # Chunks are retired one chunk further out than they are activated, so pacing over a boundary does not thrash
+        for index in [index for index in self.resident if index < first - 1 or index > last + 1]:
+            self.retire(index)
+        for index in range(first, last + 1):
+            if index not in self.resident:
+                self.activate(index)
+        for index in [index for index in self.prefetched if index < first - 2 or index > last + 2]:
+            self.prefetched.pop(index).cancel()
+
+        # Read the next chunk in the direction of travel in the background
+        if self.last_view_left is not None and view_rect.left != self.last_view_left:
+            self.prefetch(last + 1 if view_rect.left > self.last_view_left else first - 1)
+        self.last_view_left = view_rect.left
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        self.level.close()
+
 # Function to load levels
 def load_level(level_number, sound_manager):
-    enemies = pygame.sprite.Group()
-    collectibles = pygame.sprite.Group()
-
-    if level_number == 1:
-        enemies.add(Enemy(800, 400), Enemy(1200, 400))
-        collectibles.add(
-            Collectible(500, 400, 'health', sound_manager),
-            Collectible(700, 400, 'extra_life', sound_manager)
-        )
-    elif level_number == 2:
-        enemies.add(Enemy(800, 400), Enemy(1000, 400), Enemy(1200, 400))
-        collectibles.add(
-            Collectible(600, 400, 'health', sound_manager),
-            Collectible(800, 400, 'extra_life', sound_manager)
-        )
-    elif level_number == 3:
-        enemies.add(Enemy(800, 400), Enemy(1000, 400), BossEnemy(1500, 400))
-        collectibles.add(
-            Collectible(700, 400, 'health', sound_manager)
-        )
-
-    return enemies, collectibles
-
-# Functions to display HUD
-def display_score(screen, score):
-    font = pygame.font.Font(None, 36)
-    text = font.render(f'Score: {score}', True, WHITE)
-    screen.blit(text, (10, 10))
-
-def display_health(screen, player):
-    font = pygame.font.Font(None, 36)
-    text = font.render(f'Health: {player.health}', True, WHITE)
-    screen.blit(text, (10, 40))
-
-def display_lives(screen, player):
-    font = pygame.font.Font(None, 36)
-    text = font.render(f'Lives: {player.lives}', True, WHITE)
-    screen.blit(text, (10, 70))
-
-# Main menu screen
+    return LevelStreamer(open_level(level_path(level_number)), sound_manager)
+
+# HUD Widget Class
+# A line of HUD text that is only re-rendered when its value changes. The renderer sees the new surface
+# and redraws just that region.
+class HUDWidget:
+    def __init__(self, template, position, size=36, color=WHITE):
+        self.template = template
+        self.position = position
+        self.size = size
+        self.color = color
+        self.value = None
+        self.surface = None
+
+    def set_value(self, value):
+        if self.surface is None or value != self.value:
+            self.value = value
+            self.surface = text_cache.render(self.template.format(value), self.size, self.color)
+
+# HUD Class
+class HUD:
+    def __init__(self):
+        self.score = HUDWidget('Score: {}', (10, 10))
+        self.health = HUDWidget('Health: {}', (10, 40))
+        self.lives = HUDWidget('Lives: {}', (10, 70))
+        self.widgets = [self.score, self.health, self.lives]
+
+    def update(self, score, player):
+        self.score.set_value(score)
+        self.health.set_value(player.health)
+        self.lives.set_value(player.lives)
+
+# Main menu screen, drawn once when the menu opens
 def display_menu(screen):
     screen.fill(BLACK)
-    font = pygame.font.Font(None, 72)
-    title = font.render("Side-Scrolling Adventure", True, WHITE)
+    title = text_cache.render("Side-Scrolling Adventure", 72)
     screen.blit(title, (100, 150))
 
-    font = pygame.font.Font(None, 36)
-    play_text = font.render("Press ENTER to Play", True, WHITE)
+    play_text = text_cache.render("Press ENTER to Play", 36)
     screen.blit(play_text, (250, 300))
 
     pygame.display.flip()
 
-# Game over screen
+# Game over screen, drawn once when the game ends
 def game_over_screen(screen):
     screen.fill(BLACK)
-    font = pygame.font.Font(None, 72)
-    game_over = font.render("GAME OVER", True, (255, 0, 0))
+    game_over = text_cache.render("GAME OVER", 72, (255, 0, 0))
     screen.blit(game_over, (250, 150))
 
-    font = pygame.font.Font(None, 36)
-    restart_text = font.render("Press R to Restart or Q to Quit", True, WHITE)
+    restart_text = text_cache.render("Press R to Restart or Q to Quit", 36)
     screen.blit(restart_text, (200, 300))
 
     pygame.display.flip()
 
-# Main Game Function
-def main():
-    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-    pygame.display.set_caption("Side-Scrolling Adventure")
-    clock = pygame.time.Clock()
-
-    sound_manager = SoundManager()
-
-    # Game states
-    game_active = False
-    game_over = False
-    level_number = 1
-
-    # Main Menu Loop
-    while not game_active:
-        display_menu(screen)
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.KEYDOWN and event.key == pygame.K_RETURN:
-                game_active = True
-
-    # Game Loop
-    while True:
-        # Reset game variables
-        player = Player(sound_manager)
-        all_sprites = pygame.sprite.Group()
-        all_sprites.add(player)
-
-        projectiles = pygame.sprite.Group()
-        enemies, collectibles = load_level(level_number, sound_manager)
-
-        parallax_bg = ParallaxBackground()
-        camera = Camera(SCREEN_WIDTH, SCREEN_HEIGHT)
-
-        score = 0
-        game_over = False
-
-        while not game_over:
-            dt = clock.tick(FPS) / 1000  # Amount of seconds between each loop
+# Nearest-rank percentile of a list of numbers
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+# Frame Profiler Class
+# Times each subsystem per frame and keeps the most recent frames for the overlay and for export
+class FrameProfiler:
+    def __init__(self, history=PROFILE_HISTORY):
+        self.frames = deque(maxlen=history)
+        self.current = {}
+        self.frame_started = time.perf_counter()
+
+    @contextmanager
+    def section(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.current[name] = self.current.get(name, 0.0) + (time.perf_counter() - started) * 1000
+
+    def begin_frame(self):
+        self.frame_started = time.perf_counter()
+        self.current = {}
+
+    def end_frame(self):
+        record = {name: self.current.get(name, 0.0) for name in PROFILE_SECTIONS}
+        record['frame'] = (time.perf_counter() - self.frame_started) * 1000
+        self.frames.append(record)
+
+    def summary(self):
+        frame_times = [record['frame'] for record in self.frames]
+        count = len(frame_times)
+        return {
+            'frames': count,
+            'frame_ms': {
+                'mean': sum(frame_times) / count if count else 0.0,
+                'p50': percentile(frame_times, 50),
+                'p95': percentile(frame_times, 95),
+                'p99': percentile(frame_times, 99),
+                'max': max(frame_times, default=0.0),
+            },
+            'sections_ms': {name: sum(record[name] for record in self.frames) / count if count else 0.0
+                            for name in PROFILE_SECTIONS},
+        }
+
+    # Writes the kept frames as CSV or JSON, picked by the file extension
+    def export(self, path):
+        if path.endswith('.csv'):
+            with open(path, 'w', newline='', encoding='utf-8') as file:
+                writer = csv.DictWriter(file, fieldnames=('frame',) + PROFILE_SECTIONS)
+                writer.writeheader()
+                writer.writerows(self.frames)
+        else:
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump({'summary': self.summary(), 'frames': list(self.frames)}, file, indent=2)
+
+# Profiler Overlay Class
+# Frame-time graph with percentiles and per-subsystem averages, drawn in the top right corner
+class ProfilerOverlay:
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.visible = False
+        self.surface = None
+        self.position = (SCREEN_WIDTH - OVERLAY_SIZE[0] - 10, 10)
+        self.frames_since_refresh = 0
+
+    def toggle(self):
+        self.visible = not self.visible
+        self.frames_since_refresh = OVERLAY_REFRESH_FRAMES
 
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_r:
-                        main()
-                    elif event.key == pygame.K_q:
-                        pygame.quit()
-                        sys.exit()
-                    elif event.key == pygame.K_f:
-                        # Player shoots
-                        projectile = player.shoot()
-                        projectiles.add(projectile)
-                        all_sprites.add(projectile)
-
-            # Update entities
-            player.update()
-            projectiles.update()
-            enemies.update(player)
-            collectibles.update()
-            parallax_bg.update(player.velocity_x)
-
-            # Camera update
-            camera.smooth_update(player)
-
-            # Collision detection
-            for enemy in pygame.sprite.spritecollide(player, enemies, False):
-                player.health -= 1
-                if player.health <= 0:
-                    player.lives -= 1
-                    player.health = 100
-                    if player.lives <= 0:
-                        game_over = True
-
-            for projectile in projectiles:
-                hit_enemies = pygame.sprite.spritecollide(projectile, enemies, False)
-                for enemy in hit_enemies:
-                    enemy.take_damage(25)
-                    projectile.kill()
-                    score += 100
-
-            collected_items = pygame.sprite.spritecollide(player, collectibles, False)
+    def update(self):
+        if not self.visible:
+            return
+        self.frames_since_refresh += 1
+        if self.frames_since_refresh >= OVERLAY_REFRESH_FRAMES:
+            self.frames_since_refresh = 0
+            self.surface = self.build()
+
+    def build(self):
+        width, height = OVERLAY_SIZE
+        surface = pygame.Surface(OVERLAY_SIZE, pygame.SRCALPHA)
+        surface.fill((0, 0, 0, 170))
+        summary = self.profiler.summary()
+        frame_ms = summary['frame_ms']
+        # These numbers change every refresh, so they skip the text cache
+        font = assets.font(20)
+        lines = [f"frame  mean {frame_ms['mean']:.2f}  p50 {frame_ms['p50']:.2f}  p95 {frame_ms['p95']:.2f}  "
+                 f"p99 {frame_ms['p99']:.2f} ms"]
+        names = list(PROFILE_SECTIONS)
+        for left, right in zip(names[0::2], names[1::2]):
+            lines.append(f"{left:<12}{summary['sections_ms'][left]:6.2f} ms    "
+                         f"{right:<12}{summary['sections_ms'][right]:6.2f} ms")
+        for row, line in enumerate(lines):
+            surface.blit(font.render(line, True, WHITE), (8, 6 + row * 18))
+
+        # Frame-time graph with the frame budget marked
+        graph_top, graph_height = 110, height - 118
+        frame_times = [record['frame'] for record in self.profiler.frames][-(width - 16):]
+        scale = graph_height / max(2 * FRAME_BUDGET_MS, max(frame_times, default=0.0))
+        budget_y = graph_top + graph_height - FRAME_BUDGET_MS * scale
+        pygame.draw.line(surface, (255, 200, 0), (8, budget_y), (width - 8, budget_y))
+        if len(frame_times) > 1:
+            points = [(8 + index, graph_top + graph_height - value * scale) for index, value in enumerate(frame_times)]
+            pygame.draw.lines(surface, (0, 255, 0), False, points)
+        return surface
+
+# Game World Class
+# Everything the simulation steps. Rendering only reads from it, so it can also run without a display.
+class GameWorld:
+    def __init__(self, sound_manager, level_number=1, projectile_overflow=PROJECTILE_OVERFLOW,
+                 projectile_capacity=PROJECTILE_POOL_SIZE, profiler=None):
+        self.sound_manager = sound_manager
+        self.profiler = profiler if profiler is not None else FrameProfiler()
+        self.player = Player(sound_manager)
+        self.projectiles = ProjectileStore(projectile_capacity, projectile_overflow)
+        self.parallax_bg = ParallaxBackground()
+        self.camera = Camera(SCREEN_WIDTH, SCREEN_HEIGHT)
+        self.level = None
+        self.reset(level_number)
+
+    # Starts a new game on the given level. Only entity state is reset; images, sounds, the projectile
+    # pool and everything else long-lived are kept.
+    def reset(self, level_number=1):
+        self.player.reset()
+        self.projectiles.clear()
+        self.parallax_bg.reset()
+        self.camera.reset()
+
+        self.level_count = level_count()
+        self.level_number = level_number
+        self.load_level(level_number)
+
+        self.score = 0
+        self.game_over = False
+        self.level_complete = False
+        self.ticks = 0
+        # Positions before the latest tick, used to interpolate drawing between ticks. Enemies and
+        # projectiles keep theirs in their stores.
+        self.previous_player = self.player.rect.topleft
+        self.previous_camera = self.camera.camera_rect.topleft
+
+    # Moves on once the level is complete; after the last level the game is over
+    def next_level(self):
+        self.level_complete = False
+        self.level_number += 1
+        if self.level_number > self.level_count:
+            # Game completed
+            self.game_over = True
+        else:
+            self.load_level(self.level_number)
+
+    def load_level(self, level_number):
+        self.use_level(load_level(level_number, self.sound_manager))
+
+    def use_level(self, level):
+        if self.level is not None:
+            self.level.close()
+        self.level = level
+        self.enemies = self.level.enemies
+        self.collectibles = self.level.collectibles
+        self.level.update(self.view_rect())
+
+    # The camera view in world coordinates
+    def view_rect(self):
+        return pygame.Rect(-self.camera.camera_rect.x, -self.camera.camera_rect.y, SCREEN_WIDTH, SCREEN_HEIGHT)
+
+    # Advances the game by one fixed tick
+    def step(self, controls):
+        self.previous_player = self.player.rect.topleft
+        self.previous_camera = self.camera.camera_rect.topleft
+        self.ticks += 1
+
+        profiler = self.profiler
+        with profiler.section('player'):
+            if controls.shoot:
+                # Player shoots
+                self.player.shoot(self.projectiles)
+            self.player.update(controls)
+
+        # Enemies and projectiles move as whole arrays
+        with profiler.section('projectiles'):
+            self.projectiles.update(self.view_rect())
+        with profiler.section('enemies'):
+            self.enemies.update(self.player)
+            self.collectibles.update()
+        with profiler.section('parallax'):
+            self.parallax_bg.update(self.player.velocity_x)
+
+        # Camera update
+        with profiler.section('player'):
+            self.camera.smooth_update(self.player)
+
+        # Collision detection
+        with profiler.section('collisions'):
+            for _ in self.enemies.overlapping(self.player.rect):
+                self.player.health -= 1
+                if self.player.health <= 0:
+                    self.player.lives -= 1
+                    self.player.health = 100
+                    if self.player.lives <= 0:
+                        self.game_over = True
+
+            # Every hit lands, including several on one enemy in the same tick
+            shot_slots, enemy_slots = projectile_hits(self.projectiles, self.enemies)
+            if len(enemy_slots):
+                self.score += 100 * len(enemy_slots)
+                self.enemies.damage(enemy_slots, 25)
+                self.projectiles.remove_many(np.unique(shot_slots))
+
+            collected_items = self.collectibles.collide(self.player)
             for item in collected_items:
-                item.apply(player)
-                score += 50
-
-            # Drawing
-            parallax_bg.draw(screen)
-
-            for sprite in all_sprites:
-                screen.blit(sprite.image, camera.apply(sprite))
-
-            for enemy in enemies:
-                screen.blit(enemy.image, camera.apply(enemy))
-
-            for item in collectibles:
-                screen.blit(item.image, camera.apply(item))
-
-            display_score(screen, score)
-            display_health(screen, player)
-            display_lives(screen, player)
-
-            pygame.display.flip()
-            screen.fill(BLACK)
-
-            # Check if level is complete
-            if not enemies:
-                level_number += 1
-                if level_number > 3:
-                    # Game completed
-                    game_over = True
+                item.apply(self.player)
+                self.score += 50
+
+        # Bring chunks near the camera in and retire the ones left behind
+        with profiler.section('streaming'):
+            self.level.update(self.view_rect())
+
+        # Check if level is complete; the caller decides when the next one starts
+        if self.level.remaining_enemies == 0:
+            self.level_complete = True
+
+    # Camera offset blended between the last two ticks
+    def camera_offset(self, alpha):
+        previous_x, previous_y = self.previous_camera
+        current_x, current_y = self.camera.camera_rect.topleft
+        return (previous_x + (current_x - previous_x) * alpha, previous_y + (current_y - previous_y) * alpha)
+
+    # Player position blended between the last two ticks
+    def player_position(self, alpha):
+        x, y = self.player.rect.topleft
+        previous_x, previous_y = self.previous_player
+        return previous_x + (x - previous_x) * alpha, previous_y + (y - previous_y) * alpha
+
+# Renderer Class
+# Draws what is inside the camera view once per frame in a fixed layer order (background, collectibles,
+# enemies, projectiles, player, HUD). While the background holds still, only the regions that changed
+# since the last frame are redrawn and pushed to the display.
+class Renderer:
+    def __init__(self, screen, profiler=None):
+        self.screen = screen
+        self.profiler = profiler if profiler is not None else FrameProfiler()
+        self.screen_rect = screen.get_rect()
+        self.drawn = {}
+        self.background_state = None
+
+    # Forces a full redraw, after something else has drawn over the screen
+    def invalidate(self):
+        self.drawn = {}
+        self.background_state = None
+
+    # The world as it stands alpha of the way from the previous tick to the latest one
+    def visible_items(self, world, hud, overlay, alpha):
+        offset_x, offset_y = world.camera_offset(alpha)
+        view = pygame.Rect(round(-offset_x) - CULL_MARGIN, round(-offset_y) - CULL_MARGIN,
+                           SCREEN_WIDTH + 2 * CULL_MARGIN, SCREEN_HEIGHT + 2 * CULL_MARGIN)
+        items = []
+        for sprite in world.collectibles.query(view):
+            items.append((sprite, sprite.image, sprite.rect.move(round(offset_x), round(offset_y))))
+        # Only the visible slots of each store turn into draw calls
+        for store in (world.enemies, world.projectiles):
+            slots, xs, ys = store.draw_positions(view, alpha)
+            for slot, x, y in zip(slots.tolist(), xs.tolist(), ys.tolist()):
+                sprite = store.sprites[slot]
+                items.append((sprite, sprite.image, sprite.image.get_rect(topleft=(round(x + offset_x),
+                                                                                   round(y + offset_y)))))
+        x, y = world.player_position(alpha)
+        items.append((world.player, world.player.image,
+                      world.player.image.get_rect(topleft=(round(x + offset_x), round(y + offset_y)))))
+        for widget in hud.widgets:
+            items.append((widget, widget.surface, widget.surface.get_rect(topleft=widget.position)))
+        if overlay is not None and overlay.visible and overlay.surface is not None:
+            items.append((overlay, overlay.surface, overlay.surface.get_rect(topleft=overlay.position)))
+        return items
+
+    def draw(self, world, hud, alpha, overlay=None):
+        with self.profiler.section('render'):
+            self.draw_items(world, hud, alpha, overlay)
+
+    def draw_items(self, world, hud, alpha, overlay):
+        items = self.visible_items(world, hud, overlay, alpha)
+        drawn = {item: (image, rect) for item, image, rect in items}
+        background_state = world.parallax_bg.state()
+
+        dirty = None
+        if background_state == self.background_state:
+            dirty = []
+            for item, (image, rect) in drawn.items():
+                previous = self.drawn.get(item)
+                if previous != (image, rect):
+                    dirty.append(rect)
+                    if previous is not None:
+                        dirty.append(previous[1])
+            for item, (image, rect) in self.drawn.items():
+                if item not in drawn:
+                    dirty.append(rect)
+            if len(dirty) > MAX_DIRTY_RECTS:
+                dirty = None
+
+        if dirty is None:
+            # The background moved, so the whole screen changes
+            with self.profiler.section('parallax'):
+                world.parallax_bg.draw(self.screen)
+            for _, image, rect in items:
+                self.screen.blit(image, rect)
+            with self.profiler.section('display'):
+                pygame.display.flip()
+        else:
+            dirty = [rect.clip(self.screen_rect) for rect in dirty]
+            dirty = [rect for rect in dirty if rect.width and rect.height]
+            for region in dirty:
+                self.screen.set_clip(region)
+                with self.profiler.section('parallax'):
+                    world.parallax_bg.draw(self.screen)
+                for _, image, rect in items:
+                    if rect.colliderect(region):
+                        self.screen.blit(image, rect)
+            self.screen.set_clip(None)
+            if dirty:
+                with self.profiler.section('display'):
+                    pygame.display.update(dirty)
+
+        self.drawn = drawn
+        self.background_state = background_state
+
+# Autopilot Class
+# Scripted player for headless runs: walks toward the nearest enemy, jumps now and then and fires when close
+class Autopilot:
+    def __init__(self, fire_range=400, shoot_every=10, jump_every=120):
+        self.fire_range = fire_range
+        self.shoot_every = shoot_every
+        self.jump_every = jump_every
+
+    def controls(self, world):
+        enemies = world.enemies
+        if not enemies.count:
+            return Controls()
+        centers = enemies.x[:enemies.count] + enemies.w[:enemies.count] // 2
+        offsets = centers - world.player.rect.centerx
+        distance = int(offsets[np.argmin(np.abs(offsets))])
+        close = abs(distance) < self.fire_range
+        return Controls(left=distance < 0 and not close,
+                        right=distance >= 0 and not close,
+                        jump=world.ticks % self.jump_every == 0,
+                        shoot=close and world.ticks % self.shoot_every == 0)
+
+# Runs the simulation on the SDL dummy drivers as fast as the CPU allows: no drawing and no frame limit
+def run_headless(ticks, level_number=1, projectile_overflow=PROJECTILE_OVERFLOW):
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    # pygame.init() already ran at import, so restart the display and mixer on the dummy drivers
+    pygame.display.quit()
+    pygame.mixer.quit()
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+    assets.preload()
+
+    world = GameWorld(SoundManager(), level_number, projectile_overflow)
+    autopilot = Autopilot()
+    started = time.perf_counter()
+    while world.ticks < ticks and not world.game_over:
+        world.step(autopilot.controls(world))
+        if world.level_complete:
+            world.next_level()
+    elapsed = time.perf_counter() - started
+
+    print(f"Simulated {world.ticks} ticks ({world.ticks * TIME_STEP:.1f} s of game time) in {elapsed:.2f} s, "
+          f"{world.ticks / elapsed:.0f} ticks/s")
+    if world.level_number > world.level_count:
+        outcome = "completed all levels"
+    elif world.game_over:
+        outcome = "out of lives"
+    else:
+        outcome = f"still on level {world.level_number}"
+    print(f"Outcome: {outcome}, score {world.score}, health {world.player.health}, lives {world.player.lives}")
+    print(f"Projectiles: {world.projectiles.fired} fired, {world.projectiles.dropped} dropped, "
+          f"{world.projectiles.recycled} recycled")
+    return 0
+
+# Game State Class
+# One screen of the game. The Game object owns everything long-lived and switches between states, so
+# restarting never rebuilds the window, sounds or images and never grows the call stack.
+class GameState:
+    def __init__(self, game):
+        self.game = game
+
+    def enter(self):
+        pass
+
+    def handle_event(self, event):
+        pass
+
+    def update(self, frame_time):
+        pass
+
+# Menu State Class
+class MenuState(GameState):
+    def enter(self):
+        display_menu(self.game.screen)
+
+    def handle_event(self, event):
+        if event.type == pygame.VIDEOEXPOSE:
+            display_menu(self.game.screen)
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_RETURN:
+            self.game.restart()
+
+# Playing State Class
+class PlayingState(GameState):
+    def __init__(self, game):
+        super().__init__(game)
+        self.accumulator = 0.0
+        self.shoot_requested = False
+
+    def enter(self):
+        self.game.renderer.invalidate()
+
+    def handle_event(self, event):
+        if event.type != pygame.KEYDOWN:
+            return
+        if event.key == pygame.K_r:
+            self.game.restart()
+        elif event.key == pygame.K_f:
+            self.shoot_requested = True
+        elif event.key == pygame.K_F3:
+            self.game.overlay.toggle()
+        elif event.key == pygame.K_F4:
+            self.game.profiler.export(PROFILE_EXPORT_PATH)
+            print(f"Wrote {len(self.game.profiler.frames)} frame timings to {PROFILE_EXPORT_PATH}")
+
+    def update(self, frame_time):
+        game, world = self.game, self.game.world
+        # Frame time counts the work done, not the wait for the frame limit
+        game.profiler.begin_frame()
+
+        # Run as many fixed ticks as the elapsed real time calls for
+        self.accumulator += frame_time
+        while self.accumulator >= TIME_STEP and not world.game_over and not world.level_complete:
+            world.step(Controls.from_keyboard(self.shoot_requested))
+            self.shoot_requested = False
+            self.accumulator -= TIME_STEP
+
+        # Drawing, interpolated between the last two ticks
+        game.hud.update(world.score, world.player)
+        game.renderer.draw(world, game.hud, self.accumulator / TIME_STEP, game.overlay)
+        game.profiler.end_frame()
+        game.overlay.update()
+
+        if world.game_over:
+            game.change_state(GameOverState(game))
+        elif world.level_complete:
+            game.change_state(LevelTransitionState(game))
+
+# Level Transition State Class
+# Loads the next level straight away, then shows its banner over the last frame for a moment
+class LevelTransitionState(GameState):
+    def __init__(self, game):
+        super().__init__(game)
+        self.remaining = LEVEL_TRANSITION_SECONDS
+
+    def enter(self):
+        world = self.game.world
+        world.next_level()
+        if world.game_over:
+            self.game.change_state(GameOverState(self.game))
+            return
+        banner = text_cache.render(f"Level {world.level_number}", 72)
+        rect = banner.get_rect(center=self.game.screen.get_rect().center)
+        self.game.screen.blit(banner, rect)
+        pygame.display.update(rect)
+
+    def update(self, frame_time):
+        self.remaining -= frame_time
+        if self.remaining <= 0:
+            self.game.change_state(PlayingState(self.game))
+
+# Game Over State Class
+class GameOverState(GameState):
+    def enter(self):
+        game_over_screen(self.game.screen)
+
+    def handle_event(self, event):
+        if event.type == pygame.VIDEOEXPOSE:
+            game_over_screen(self.game.screen)
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_r:
+            self.game.restart()
+
+# Game Class
+# Owns the window, sounds, renderer, profiler and the one game world, and runs the current state
+class Game:
+    def __init__(self, projectile_overflow=PROJECTILE_OVERFLOW):
+        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        pygame.display.set_caption("Side-Scrolling Adventure")
+        self.clock = pygame.time.Clock()
+        assets.preload()
+
+        self.sound_manager = SoundManager()
+        self.profiler = FrameProfiler()
+        self.renderer = Renderer(self.screen, self.profiler)
+        self.overlay = ProfilerOverlay(self.profiler)
+        self.hud = HUD()
+        self.world = GameWorld(self.sound_manager, projectile_overflow=projectile_overflow, profiler=self.profiler)
+
+        self.running = True
+        self.state = None
+        self.change_state(MenuState(self))
+
+    def change_state(self, state):
+        self.state = state
+        state.enter()
+
+    # New game from level 1, reusing everything that is already loaded
+    def restart(self):
+        self.world.reset()
+        self.change_state(PlayingState(self))
+
+    def run(self):
+        while self.running:
+            frame_time = min(self.clock.tick(FPS) / 1000, MAX_FRAME_TIME)
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_q):
+                    self.running = False
                 else:
-                    # Load next level
-                    enemies, collectibles = load_level(level_number, sound_manager)
+                    self.state.handle_event(event)
+            self.state.update(frame_time)
+        self.world.level.close()
+        pygame.quit()
 
-        # Game Over Screen
-        while True:
-            game_over_screen(screen)
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_r:
-                        main()
-                    elif event.key == pygame.K_q:
-                        pygame.quit()
-                        sys.exit()
+# Main Game Function
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Side-Scrolling Adventure")
+    parser.add_argument("--headless", action="store_true",
+                        help="run the simulation without a window as fast as possible, driven by an autopilot")
+    parser.add_argument("--ticks", type=int, default=36000, help="ticks to simulate in headless mode")
+    parser.add_argument("--level", type=int, default=1, help="level to start on in headless mode")
+    parser.add_argument("--projectile-overflow", choices=('drop', 'reuse_oldest'), default=PROJECTILE_OVERFLOW,
+                        help="what a shot does when all pooled projectiles are in flight")
+    parser.add_argument("--compile-level", metavar="JSON",
+                        help="convert a JSON level into the packed .lvl form next to it and exit")
+    args = parser.parse_args(argv)
+
+    if args.compile_level:
+        output_path = os.path.splitext(args.compile_level)[0] + '.lvl'
+        level = compile_level(args.compile_level, output_path)
+        print(f"Wrote {output_path}: {level.chunk_count} chunks, {level.enemy_count} enemies, "
+              f"{os.path.getsize(output_path)} bytes")
+        return 0
+
+    if args.headless:
+        return run_headless(args.ticks, args.level, args.projectile_overflow)
+    Game(args.projectile_overflow).run()
+    return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())